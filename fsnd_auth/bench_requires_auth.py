@@ -0,0 +1,56 @@
+'''
+Micro-benchmark for requests per second through Auth.requires_auth.
+
+Runs a protected Flask route through the test client with an in-memory
+signing key, once with the verified-token cache disabled (signature check
+on every request) and once with it enabled.
+
+    python bench_requires_auth.py [requests]
+'''
+import sys
+import time
+
+from flask import Flask
+
+from fsnd_auth import AllOf, Auth, TokenCache
+from fsnd_auth.testing import LocalSigningKey
+
+
+def build_app(auth):
+    app = Flask(__name__)
+
+    @app.route('/drinks-detail')
+    @auth.requires_auth(AllOf('get:drinks-detail'))
+    def drinks_detail(payload):
+        return 'ok'
+
+    return app
+
+
+def run(auth, token, requests):
+    client = build_app(auth).test_client()
+    headers = {'Authorization': 'Bearer ' + token}
+    client.get('/drinks-detail', headers=headers)
+
+    started = time.perf_counter()
+    for _ in range(requests):
+        response = client.get('/drinks-detail', headers=headers)
+        assert response.status_code == 200, response.data
+    return requests / (time.perf_counter() - started)
+
+
+def main(requests=2000):
+    key = LocalSigningKey()
+    # a token from a service account carrying a few hundred scopes
+    permissions = ['get:drinks-detail'] + ['scope:%d' % i for i in range(300)]
+
+    for label, token_cache in (('no token cache', TokenCache(maxsize=0)),
+                               ('token cache', TokenCache())):
+        auth = Auth('bench.auth0.com', 'bench', key_source=key.key_source(),
+                    token_cache=token_cache)
+        token = key.token(auth, permissions=permissions)
+        print('%-16s %8.0f req/s' % (label, run(auth, token, requests)))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:2]])
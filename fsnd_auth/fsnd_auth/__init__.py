@@ -0,0 +1,6 @@
+from .auth import Auth, get_token_auth_header
+from .cache import TokenCache
+from .errors import AuthError
+from .keys import JWKSCache, StaticKeys, construct_keys, file_fetcher, url_fetcher
+from .permissions import (AllOf, AnyOf, check_permissions, compile_permissions,
+                          required_permissions)
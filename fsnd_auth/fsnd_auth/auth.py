@@ -0,0 +1,154 @@
+from functools import wraps
+
+from flask import request
+from jose import jwt
+
+from .cache import TokenCache
+from .errors import AuthError
+from .keys import JWKSCache, url_fetcher
+from .permissions import check_permissions, compile_permissions, required_permissions
+
+
+## Auth Header
+def get_token_auth_header():
+    auth = request.headers.get('Authorization', None)
+    if not auth:
+        raise AuthError({
+            'code': 'authorization_header_missing',
+            'description': 'Authorization header is expected.'
+        }, 401)
+    parts = auth.split()
+    if parts[0].lower() != 'bearer':
+        raise AuthError({
+            'code': 'invalid_header',
+            'description': 'Authorization header must start with "Bearer".'
+        }, 401)
+    elif len(parts) == 1:
+        raise AuthError({
+            'code': 'invalid_header',
+            'description': 'Token not found.'
+        }, 401)
+    elif len(parts) > 2:
+        raise AuthError({
+            'code': 'invalid_header',
+            'description': 'Authorization header must be bearer token.'
+        }, 401)
+    token = parts[1]
+    return token
+
+
+'''
+Auth
+    JWT verification for one Auth0 API
+    - `domain` / `audience` identify the tenant and the API
+    - `key_source` is anything with get_key(kid) and key_version, by default
+      a JWKSCache over https://<domain>/.well-known/jwks.json
+    - `token_cache` keeps verified payloads, pass TokenCache(maxsize=0) to disable
+    EXAMPLE
+        auth = Auth('ravi-fsnd.auth0.com', 'Coffee shop')
+        requires_auth = auth.requires_auth
+'''
+class Auth:
+    def __init__(self, domain, audience, algorithms=('RS256',),
+                 key_source=None, token_cache=None):
+        self.domain = domain
+        self.audience = audience
+        self.algorithms = list(algorithms)
+        self.issuer = 'https://' + domain + '/'
+        if key_source is None:
+            key_source = JWKSCache(
+                url_fetcher(f'https://{domain}/.well-known/jwks.json'),
+                algorithm=self.algorithms[0])
+        self.token_cache = token_cache if token_cache is not None else TokenCache()
+        self.key_source = key_source
+
+    @property
+    def key_source(self):
+        return self._key_source
+
+    @key_source.setter
+    def key_source(self, key_source):
+        # payloads verified with the previous keys must not outlive them, and
+        # the new source counts its key versions from the start again
+        self._key_source = key_source
+        self.token_cache.reset(key_source.key_version)
+
+    def verify_decode_jwt(self, token):
+        key_source = self.key_source
+        payload = self.token_cache.get(token, key_source.key_version)
+        if payload is not None:
+            return payload
+
+        try:
+            unverified_header = jwt.get_unverified_header(token)
+        except Exception:
+            raise AuthError({
+                'code': 'invalid_header',
+                'description': 'Unable to parse authentication token.'
+            }, 400)
+        if 'kid' not in unverified_header:
+            raise AuthError({
+                'code': 'invalid_header',
+                'description': 'Authorization malformed.'
+            }, 401)
+
+        rsa_key = key_source.get_key(unverified_header['kid'])
+        key_version = key_source.key_version
+        if rsa_key is None:
+            raise AuthError({
+                'code': 'invalid_header',
+                'description': 'Unable to find the appropriate key.'
+            }, 400)
+
+        try:
+            payload = jwt.decode(
+                token,
+                rsa_key,
+                algorithms=self.algorithms,
+                audience=self.audience,
+                issuer=self.issuer
+            )
+        except jwt.ExpiredSignatureError:
+            raise AuthError({
+                'code': 'token_expired',
+                'description': 'Token expired.'
+            }, 401)
+        except jwt.JWTClaimsError:
+            raise AuthError({
+                'code': 'invalid_claims',
+                'description': 'Incorrect claims. Please, check the audience and issuer.'
+            }, 401)
+        except Exception:
+            raise AuthError({
+                'code': 'invalid_header',
+                'description': 'Unable to parse authentication token.'
+            }, 400)
+
+        compile_permissions(payload)
+        # not cached if the key source was swapped while verifying
+        if self.key_source is key_source:
+            self.token_cache.put(token, payload, key_version)
+        return payload
+
+    def health(self):
+        return {
+            'keys': self.key_source.health(),
+            'token_cache': self.token_cache.stats()
+        }
+
+    def check_permissions(self, permission, payload):
+        return check_permissions(permission, payload)
+
+    def requires_auth(self, permission=''):
+        required = required_permissions(permission)
+
+        def requires_auth_decorator(f):
+            @wraps(f)
+            def wrapper(*args, **kwargs):
+                token = get_token_auth_header()
+                payload = self.verify_decode_jwt(token)
+                check_permissions(required, payload)
+                return f(payload, *args, **kwargs)
+
+            return wrapper
+        return requires_auth_decorator
@@ -0,0 +1,88 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+TOKEN_CACHE_SIZE = 1024
+
+
+'''
+TokenCache
+    bounded LRU of decoded payloads, keyed by the sha256 digest of the token
+    - an entry expires at the token's own `exp` claim
+    - every entry is dropped when the key source's `key_version` changes,
+      and by reset() when Auth is given another key source
+    - `hits` / `misses` are kept to help sizing `maxsize`
+'''
+class TokenCache:
+    def __init__(self, maxsize=TOKEN_CACHE_SIZE, clock=time.time):
+        self.maxsize = maxsize
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.key_version = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def digest(token):
+        return hashlib.sha256(token.encode()).digest()
+
+    def _sync(self, key_version):
+        # key versions only grow, a newer one means the keys rotated
+        if key_version > self.key_version:
+            self._entries.clear()
+            self.key_version = key_version
+        return key_version == self.key_version
+
+    def get(self, token, key_version):
+        digest = self.digest(token)
+        with self._lock:
+            entry = None
+            if self._sync(key_version):
+                entry = self._entries.get(digest)
+            if entry is not None:
+                expires_at, payload = entry
+                if expires_at > self.clock():
+                    self._entries.move_to_end(digest)
+                    self.hits += 1
+                    return payload
+                del self._entries[digest]
+
+            self.misses += 1
+            return None
+
+    def put(self, token, payload, key_version):
+        expires_at = payload.get('exp')
+        if not isinstance(expires_at, (int, float)) or self.maxsize <= 0:
+            return
+
+        digest = self.digest(token)
+        with self._lock:
+            # the keys rotated again while this token was being verified
+            if not self._sync(key_version):
+                return
+            self._entries[digest] = (expires_at, payload)
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def reset(self, key_version=0):
+        '''
+        drops every entry and starts over at `key_version`, for a new key source
+        '''
+        with self._lock:
+            self._entries.clear()
+            self.key_version = key_version
+
+    def stats(self):
+        return {
+            'size': len(self._entries),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses
+        }
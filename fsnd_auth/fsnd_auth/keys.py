@@ -0,0 +1,260 @@
+import json
+import os
+import threading
+import time
+from urllib.request import urlopen
+
+from jose import jwk
+
+from .errors import AuthError
+
+JWKS_CACHE_TTL = 600
+JWKS_MIN_REFRESH_INTERVAL = 30
+JWKS_FETCH_TIMEOUT = 5
+# share of the ttl after which the background refresher fetches again
+JWKS_REFRESH_AHEAD = 0.8
+
+
+'''
+url_fetcher(url) / file_fetcher(path)
+    build the zero-argument callables JWKSCache uses to load a key set,
+    either from the Auth0 endpoint or from a local JWKS file
+'''
+def url_fetcher(url, timeout=JWKS_FETCH_TIMEOUT):
+    def fetch():
+        with urlopen(url, timeout=timeout) as jsonurl:
+            return json.loads(jsonurl.read())
+    return fetch
+
+
+def file_fetcher(path):
+    def fetch():
+        with open(path) as jwks_file:
+            return json.load(jwks_file)
+    return fetch
+
+
+'''
+construct_keys(jwks, algorithm)
+    parses every RSA key of a JWKS document into a jose Key object,
+    indexed by kid, so verification never rebuilds keys per request
+'''
+def construct_keys(jwks, algorithm='RS256'):
+    return {
+        key['kid']: jwk.construct(key, algorithm)
+        for key in jwks['keys']
+        if key.get('kty') == 'RSA' and key.get('use', 'sig') == 'sig'
+    }
+
+
+'''
+StaticKeys
+    key source over a fixed key set, for a local JWKS document or an
+    in-memory test key
+    EXAMPLE
+        keys = StaticKeys({'keys': [public_jwk]})
+'''
+class StaticKeys:
+    def __init__(self, jwks, algorithm='RS256'):
+        self.keys = construct_keys(jwks, algorithm)
+        self.key_version = 0
+
+    def get_key(self, kid):
+        return self.keys.get(kid)
+
+    def health(self):
+        return {
+            'kids': sorted(self.keys),
+            'key_version': self.key_version,
+            'healthy': bool(self.keys)
+        }
+
+
+'''
+JWKSCache
+    process-wide store of the signing keys, indexed by kid
+    - keys are reused until `ttl` seconds after the last successful fetch
+    - concurrent misses share a single fetch (single-flight)
+    - an unknown kid forces a refresh, at most once per `min_refresh_interval`
+    - if a refresh fails the previous keys keep being served
+    with `background=True` a daemon thread keeps the keys warm instead,
+    refreshing at `refresh_ahead` of the ttl, and get_key never fetches:
+    an unknown kid only wakes the refresher up
+'''
+class JWKSCache:
+    def __init__(self, fetcher, ttl=JWKS_CACHE_TTL,
+                 min_refresh_interval=JWKS_MIN_REFRESH_INTERVAL,
+                 algorithm='RS256', clock=time.monotonic,
+                 background=False, refresh_ahead=JWKS_REFRESH_AHEAD,
+                 warm_timeout=JWKS_FETCH_TIMEOUT):
+        self.fetcher = fetcher
+        self.ttl = ttl
+        self.min_refresh_interval = min_refresh_interval
+        self.background = background
+        self.refresh_ahead = refresh_ahead
+        self.warm_timeout = warm_timeout
+        self.algorithm = algorithm
+        self.clock = clock
+        self.jwks = {}
+        self.keys = {}
+        # bumped on every successful fetch
+        self.generation = 0
+        # bumped only when the fetched key set differs, i.e. on rotation
+        self.key_version = 0
+        self.fetched_at = None
+        self.last_attempt = None
+        self.last_error = None
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._refresher = None
+        self._refresher_pid = None
+        self._unknown_kid = False
+        self._wakeup = threading.Event()
+        self._warm = threading.Event()
+
+    def is_fresh(self):
+        return (self.fetched_at is not None
+                and self.clock() - self.fetched_at < self.ttl)
+
+    def get_key(self, kid):
+        if self.background:
+            return self._get_key_from_refresher(kid)
+
+        generation = self.generation
+        if not self.is_fresh():
+            self.refresh(generation)
+            generation = self.generation
+
+        key = self.keys.get(kid)
+        if key is None:
+            # the signing keys may have been rotated since the last fetch
+            self.refresh(generation)
+            key = self.keys.get(kid)
+        return key
+
+    def refresh(self, seen_generation=None):
+        # one fetch at a time; self._lock is only held to swap in the result,
+        # so readers never wait on the network
+        with self._refresh_lock:
+            # another thread refreshed while this one waited for the lock
+            if seen_generation is not None and seen_generation != self.generation:
+                return self.keys
+
+            now = self.clock()
+            if (self.keys and self.last_attempt is not None
+                    and now - self.last_attempt < self.min_refresh_interval):
+                return self.keys
+
+            self.last_attempt = now
+            try:
+                jwks = self.fetcher()
+                raw = {key['kid']: key for key in jwks['keys']}
+                rotated = raw != self.jwks
+                if rotated:
+                    keys = construct_keys(jwks, self.algorithm)
+            except Exception as e:
+                self.last_error = str(e)
+                if self.keys:
+                    # serve stale keys rather than failing every request
+                    return self.keys
+                raise AuthError({
+                    'code': 'jwks_unavailable',
+                    'description': 'Unable to fetch the signing keys.'
+                }, 503)
+
+            with self._lock:
+                if rotated:
+                    self.jwks = raw
+                    self.keys = keys
+                    self.key_version += 1
+
+                self.fetched_at = now
+                self.last_error = None
+                self.generation += 1
+                return self.keys
+
+    def clear(self):
+        with self._refresh_lock, self._lock:
+            self.jwks = {}
+            self.keys = {}
+            self.fetched_at = None
+            self.last_attempt = None
+            self.generation += 1
+            self.key_version += 1
+
+    ## Background refresh
+    def _refresher_running(self):
+        # threads do not survive a fork, so each worker process starts its own
+        refresher = self._refresher
+        return (refresher is not None and self._refresher_pid == os.getpid()
+                and refresher.is_alive())
+
+    def start(self):
+        # called on every get_key, only take the lock to start the thread
+        if self._refresher_running():
+            return
+        with self._lock:
+            if self._refresher_running():
+                return
+            self._refresher_pid = os.getpid()
+            self._refresher = threading.Thread(
+                target=self._run, name='jwks-refresher', daemon=True)
+            self._refresher.start()
+
+    def _get_key_from_refresher(self, kid):
+        self.start()
+        if not self.keys:
+            # cold start, wait for the refresher's first fetch
+            self._warm.wait(self.warm_timeout)
+
+        key = self.keys.get(kid)
+        if key is None:
+            # the signing keys may have been rotated, let the refresher look
+            self._unknown_kid = True
+            self._wakeup.set()
+            if not self.keys:
+                raise AuthError({
+                    'code': 'jwks_unavailable',
+                    'description': 'Unable to fetch the signing keys.'
+                }, 503)
+        return key
+
+    def _seconds_until_refresh(self):
+        if self.last_attempt is None:
+            return 0
+        if self.last_error is not None or self._unknown_kid:
+            delay = self.min_refresh_interval
+        else:
+            delay = self.ttl * self.refresh_ahead
+        return max(0, self.last_attempt + delay - self.clock())
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self._seconds_until_refresh())
+            self._wakeup.clear()
+            if self._seconds_until_refresh() > 0:
+                # woken up early, e.g. by an unknown kid right after a fetch
+                continue
+            self._unknown_kid = False
+            try:
+                self.refresh()
+            except AuthError:
+                pass
+            finally:
+                self._warm.set()
+
+    def health(self):
+        now = self.clock()
+        return {
+            'kids': sorted(self.keys),
+            'key_version': self.key_version,
+            'key_age': None if self.fetched_at is None else now - self.fetched_at,
+            'fresh': self.is_fresh(),
+            'last_fetch': None if self.last_attempt is None else {
+                'seconds_ago': now - self.last_attempt,
+                'ok': self.last_error is None,
+                'error': self.last_error
+            },
+            'background_refresh': self._refresher_running(),
+            'healthy': bool(self.keys)
+        }
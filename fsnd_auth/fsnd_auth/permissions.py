@@ -0,0 +1,61 @@
+from flask import abort
+
+
+'''
+AllOf(*permissions) / AnyOf(*permissions)
+    a set of permissions required by a route, satisfied when the token
+    grants every one of them (AllOf) or at least one of them (AnyOf)
+    EXAMPLE
+        @requires_auth(AnyOf('patch:drinks', 'post:drinks'))
+'''
+class AllOf(frozenset):
+    def __new__(cls, *permissions):
+        return super().__new__(cls, permissions)
+
+    def satisfied_by(self, granted):
+        return self <= granted
+
+
+class AnyOf(frozenset):
+    def __new__(cls, *permissions):
+        return super().__new__(cls, permissions)
+
+    def satisfied_by(self, granted):
+        return not self.isdisjoint(granted)
+
+
+'''
+required_permissions(permission)
+    normalizes what a route asks for into an AllOf / AnyOf set,
+    a plain string or a list of strings means all of them
+'''
+def required_permissions(permission):
+    if isinstance(permission, (AllOf, AnyOf)):
+        return permission
+    if not permission:
+        return AllOf()
+    if isinstance(permission, str):
+        return AllOf(permission)
+    return AllOf(*permission)
+
+
+'''
+compile_permissions(payload)
+    stores the granted permissions as a frozenset under 'permission_set',
+    done once per verified token so checks do not scan the claim list
+'''
+def compile_permissions(payload):
+    if 'permissions' in payload and 'permission_set' not in payload:
+        payload['permission_set'] = frozenset(payload['permissions'])
+    return payload
+
+
+def check_permissions(permission, payload):
+    if 'permissions' not in payload:
+        abort(400)
+
+    granted = compile_permissions(payload)['permission_set']
+    if not required_permissions(permission).satisfied_by(granted):
+        abort(403)
+
+    return True
@@ -0,0 +1,57 @@
+import base64
+import time
+
+from jose import jwt
+
+from .keys import StaticKeys
+
+
+def _b64_uint(value):
+    raw = value.to_bytes((value.bit_length() + 7) // 8, 'big')
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode()
+
+
+'''
+LocalSigningKey
+    an in-memory RSA signing key for tests and benchmarks, it signs tokens
+    the way Auth0 would and exposes the matching public JWKS
+    EXAMPLE
+        key = LocalSigningKey()
+        auth = Auth('example.auth0.com', 'api', key_source=key.key_source())
+        token = key.token(auth, permissions=['get:drinks-detail'])
+'''
+class LocalSigningKey:
+    def __init__(self, kid='test-key'):
+        # cryptography is pulled in by python-jose[cryptography]
+        from cryptography.hazmat.primitives import serialization
+        from cryptography.hazmat.primitives.asymmetric import rsa
+
+        self.kid = kid
+        private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        self.private_pem = private_key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption()).decode()
+        numbers = private_key.public_key().public_numbers()
+        self.jwks = {'keys': [{
+            'kty': 'RSA',
+            'kid': kid,
+            'use': 'sig',
+            'alg': 'RS256',
+            'n': _b64_uint(numbers.n),
+            'e': _b64_uint(numbers.e)
+        }]}
+
+    def key_source(self):
+        return StaticKeys(self.jwks)
+
+    def token(self, auth, permissions=(), expires_in=3600, **claims):
+        claims.setdefault('sub', 'test|user')
+        claims.update({
+            'iss': auth.issuer,
+            'aud': auth.audience,
+            'exp': int(time.time()) + expires_in,
+            'permissions': list(permissions)
+        })
+        return jwt.encode(claims, self.private_pem, algorithm='RS256',
+                          headers={'kid': self.kid})
@@ -0,0 +1,12 @@
+from setuptools import setup
+
+setup(
+    name='fsnd-auth',
+    version='0.1.0',
+    description='Auth0 JWT verification shared by the FSND Flask apps',
+    packages=['fsnd_auth'],
+    install_requires=[
+        'Flask',
+        'python-jose[cryptography]>=3.0',
+    ],
+)
@@ -0,0 +1,336 @@
+'''
+Tests of the fsnd_auth package: the JWKS cache and its background
+refresher, the verified token cache, permissions and Auth.requires_auth.
+
+    python test_fsnd_auth.py
+'''
+import threading
+import time
+import unittest
+
+from flask import Flask, jsonify
+
+from fsnd_auth import (AllOf, AnyOf, Auth, AuthError, JWKSCache, TokenCache,
+                       check_permissions, required_permissions)
+from fsnd_auth.testing import LocalSigningKey
+
+signing_key = None
+rotated_key = None
+
+
+def setUpModule():
+    """Generates the RSA keys once, it is the slow part of the tests."""
+    global signing_key, rotated_key
+    signing_key = LocalSigningKey()
+    rotated_key = LocalSigningKey(kid='rotated-key')
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class Fetcher:
+    """A JWKS fetcher counting its calls, serving `jwks` or raising `error`."""
+
+    def __init__(self, jwks):
+        self.jwks = jwks
+        self.error = None
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.error is not None:
+            raise self.error
+        return self.jwks
+
+
+class JWKSCacheTestCase(unittest.TestCase):
+    """The JWKS cache, fetching on the request path."""
+
+    def setUp(self):
+        self.clock = Clock()
+        self.fetcher = Fetcher(signing_key.jwks)
+        self.cache = JWKSCache(self.fetcher, ttl=600, min_refresh_interval=30,
+                               clock=self.clock)
+
+    def test_keys_are_reused_until_the_ttl(self):
+        self.assertIsNotNone(self.cache.get_key('test-key'))
+        self.clock.now += 599
+        self.assertIsNotNone(self.cache.get_key('test-key'))
+        self.assertEqual(self.fetcher.calls, 1)
+
+        self.clock.now += 1
+        self.assertIsNotNone(self.cache.get_key('test-key'))
+        self.assertEqual(self.fetcher.calls, 2)
+
+    def test_unknown_kid_forces_a_refresh(self):
+        self.cache.get_key('test-key')
+        self.clock.now += 30
+        self.fetcher.jwks = rotated_key.jwks
+
+        self.assertIsNotNone(self.cache.get_key('rotated-key'))
+        self.assertEqual(self.fetcher.calls, 2)
+        self.assertEqual(self.cache.key_version, 2)
+
+    def test_unknown_kid_refreshes_at_most_once_per_interval(self):
+        self.cache.get_key('test-key')
+        self.assertIsNone(self.cache.get_key('unknown'))
+        self.assertIsNone(self.cache.get_key('unknown'))
+        self.assertEqual(self.fetcher.calls, 1)
+
+        self.clock.now += 30
+        self.assertIsNone(self.cache.get_key('unknown'))
+        self.assertEqual(self.fetcher.calls, 2)
+
+    def test_unchanged_key_set_keeps_the_key_version(self):
+        self.cache.get_key('test-key')
+        self.clock.now += 600
+        self.cache.get_key('test-key')
+
+        self.assertEqual(self.fetcher.calls, 2)
+        self.assertEqual(self.cache.generation, 2)
+        self.assertEqual(self.cache.key_version, 1)
+
+    def test_stale_keys_are_served_when_the_fetch_fails(self):
+        self.cache.get_key('test-key')
+        self.clock.now += 600
+        self.fetcher.error = OSError('auth0 is down')
+
+        self.assertIsNotNone(self.cache.get_key('test-key'))
+        health = self.cache.health()
+        self.assertFalse(health['fresh'])
+        self.assertTrue(health['healthy'])
+        self.assertEqual(health['last_fetch']['error'], 'auth0 is down')
+
+    def test_503_without_any_keys(self):
+        self.fetcher.error = OSError('auth0 is down')
+
+        with self.assertRaises(AuthError) as raised:
+            self.cache.get_key('test-key')
+        self.assertEqual(raised.exception.status_code, 503)
+        self.assertFalse(self.cache.health()['healthy'])
+
+    def test_concurrent_misses_share_a_fetch(self):
+        fetched = threading.Event()
+
+        def slow_fetch():
+            self.fetcher.calls += 1
+            fetched.wait(1)
+            return signing_key.jwks
+
+        self.cache.fetcher = slow_fetch
+        threads = [threading.Thread(target=self.cache.get_key, args=('test-key',))
+                   for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.05)
+        fetched.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.fetcher.calls, 1)
+
+
+class BackgroundRefreshTestCase(unittest.TestCase):
+    """The JWKS cache, kept warm by its background thread."""
+
+    def setUp(self):
+        self.fetcher = Fetcher(signing_key.jwks)
+        self.cache = JWKSCache(self.fetcher, ttl=0.2, refresh_ahead=0.5,
+                               min_refresh_interval=0.05, background=True)
+
+    def wait_for(self, condition, timeout=2):
+        deadline = time.monotonic() + timeout
+        while not condition():
+            if time.monotonic() > deadline:
+                self.fail('timed out')
+            time.sleep(0.01)
+
+    def test_cold_start_waits_for_the_first_fetch(self):
+        self.assertIsNotNone(self.cache.get_key('test-key'))
+        self.assertTrue(self.cache.health()['background_refresh'])
+
+    def test_keys_are_refreshed_ahead_of_the_ttl(self):
+        self.cache.get_key('test-key')
+        self.wait_for(lambda: self.fetcher.calls >= 3)
+        self.assertTrue(self.cache.is_fresh())
+
+    def test_unknown_kid_wakes_the_refresher_up(self):
+        self.cache.refresh_ahead = 100
+        self.cache.get_key('test-key')
+        self.fetcher.jwks = rotated_key.jwks
+
+        self.assertIsNone(self.cache.get_key('rotated-key'))
+        self.wait_for(lambda: self.cache.keys.get('rotated-key') is not None)
+        self.assertEqual(self.fetcher.calls, 2)
+
+    def test_get_key_does_not_wait_for_a_refresh(self):
+        self.cache.get_key('test-key')
+        refreshing = threading.Event()
+        release = threading.Event()
+
+        def slow_fetch():
+            refreshing.set()
+            release.wait(2)
+            return signing_key.jwks
+
+        self.fetcher.jwks = None
+        self.cache.fetcher = slow_fetch
+        self.assertTrue(refreshing.wait(2))
+        try:
+            started = time.monotonic()
+            self.assertIsNotNone(self.cache.get_key('test-key'))
+            self.assertIsNone(self.cache.get_key('unknown'))
+            self.assertLess(time.monotonic() - started, 0.5)
+        finally:
+            release.set()
+
+
+class TokenCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock()
+        self.cache = TokenCache(maxsize=2, clock=self.clock)
+
+    def test_entries_expire_at_the_token_exp(self):
+        self.cache.put('token', {'exp': 1010}, 1)
+        self.assertEqual(self.cache.get('token', 1), {'exp': 1010})
+
+        self.clock.now = 1010
+        self.assertIsNone(self.cache.get('token', 1))
+        self.assertEqual(self.cache.stats()['size'], 0)
+
+    def test_key_rotation_drops_every_entry(self):
+        self.cache.put('token', {'exp': 2000}, 1)
+        self.assertIsNone(self.cache.get('token', 2))
+
+        # verified against the previous keys, while they rotated
+        self.cache.put('other', {'exp': 2000}, 1)
+        self.assertIsNone(self.cache.get('other', 2))
+        self.assertEqual(self.cache.stats()['size'], 0)
+
+    def test_least_recently_used_entry_is_evicted(self):
+        self.cache.put('a', {'exp': 2000}, 1)
+        self.cache.put('b', {'exp': 2000}, 1)
+        self.cache.get('a', 1)
+        self.cache.put('c', {'exp': 2000}, 1)
+
+        self.assertIsNotNone(self.cache.get('a', 1))
+        self.assertIsNone(self.cache.get('b', 1))
+        self.assertIsNotNone(self.cache.get('c', 1))
+
+    def test_tokens_without_exp_are_not_cached(self):
+        self.cache.put('token', {'sub': 'user'}, 1)
+        self.assertIsNone(self.cache.get('token', 1))
+        self.assertEqual(self.cache.stats()['misses'], 1)
+
+
+class PermissionsTestCase(unittest.TestCase):
+    def test_all_of(self):
+        required = AllOf('get:drinks', 'post:drinks')
+        self.assertTrue(required.satisfied_by(frozenset(['get:drinks', 'post:drinks', 'x'])))
+        self.assertFalse(required.satisfied_by(frozenset(['get:drinks'])))
+
+    def test_any_of(self):
+        required = AnyOf('patch:drinks', 'post:drinks')
+        self.assertTrue(required.satisfied_by(frozenset(['post:drinks'])))
+        self.assertFalse(required.satisfied_by(frozenset(['get:drinks'])))
+
+    def test_required_permissions(self):
+        self.assertEqual(required_permissions('get:drinks'), AllOf('get:drinks'))
+        self.assertEqual(required_permissions(['a', 'b']), AllOf('a', 'b'))
+        self.assertEqual(required_permissions(''), AllOf())
+        self.assertIsInstance(required_permissions(AnyOf('a')), AnyOf)
+
+    def test_check_permissions(self):
+        app = Flask(__name__)
+        with app.test_request_context():
+            self.assertTrue(check_permissions('a', {'permissions': ['a', 'b']}))
+            with self.assertRaises(Exception) as raised:
+                check_permissions('c', {'permissions': ['a', 'b']})
+            self.assertEqual(raised.exception.code, 403)
+            with self.assertRaises(Exception) as raised:
+                check_permissions('a', {})
+            self.assertEqual(raised.exception.code, 400)
+
+
+class RequiresAuthTestCase(unittest.TestCase):
+    def setUp(self):
+        self.auth = Auth('example.auth0.com', 'api', key_source=signing_key.key_source())
+        app = Flask(__name__)
+
+        @app.route('/drinks-detail')
+        @self.auth.requires_auth(AnyOf('get:drinks-detail', 'patch:drinks'))
+        def drinks_detail(payload):
+            return jsonify({'sub': payload['sub']})
+
+        @app.errorhandler(AuthError)
+        def handle_auth_error(ex):
+            response = jsonify(ex.error)
+            response.status_code = ex.status_code
+            return response
+
+        self.client = app.test_client()
+
+    def get(self, token):
+        return self.client.get('/drinks-detail', headers={'Authorization': 'Bearer ' + token})
+
+    def test_valid_token(self):
+        token = signing_key.token(self.auth, permissions=['patch:drinks'])
+
+        res = self.get(token)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.get_json()['sub'], 'test|user')
+
+        self.get(token)
+        self.assertEqual(self.auth.token_cache.stats()['hits'], 1)
+
+    def test_403_missing_permission(self):
+        res = self.get(signing_key.token(self.auth, permissions=['delete:drinks']))
+        self.assertEqual(res.status_code, 403)
+
+    def test_401_missing_header(self):
+        res = self.client.get('/drinks-detail')
+        self.assertEqual(res.status_code, 401)
+        self.assertEqual(res.get_json()['code'], 'authorization_header_missing')
+
+    def test_401_expired_token(self):
+        res = self.get(signing_key.token(self.auth, expires_in=-60))
+        self.assertEqual(res.status_code, 401)
+        self.assertEqual(res.get_json()['code'], 'token_expired')
+
+    def test_401_wrong_audience(self):
+        other = Auth('example.auth0.com', 'other api', key_source=signing_key.key_source())
+        res = self.get(signing_key.token(other, permissions=['patch:drinks']))
+        self.assertEqual(res.status_code, 401)
+        self.assertEqual(res.get_json()['code'], 'invalid_claims')
+
+    def test_swapping_the_key_source_drops_verified_tokens(self):
+        token = signing_key.token(self.auth, permissions=['patch:drinks'])
+        self.assertEqual(self.get(token).status_code, 200)
+
+        self.auth.key_source = rotated_key.key_source()
+        self.assertEqual(self.auth.token_cache.stats()['size'], 0)
+        self.assertEqual(self.get(token).status_code, 400)
+
+    def test_tokens_are_cached_after_a_swap_to_a_lower_key_version(self):
+        self.auth.key_source.key_version = 3
+        self.get(signing_key.token(self.auth, permissions=['patch:drinks']))
+
+        self.auth.key_source = rotated_key.key_source()
+        token = rotated_key.token(self.auth, permissions=['patch:drinks'])
+        self.assertEqual(self.get(token).status_code, 200)
+        self.assertEqual(self.get(token).status_code, 200)
+        self.assertEqual(self.auth.token_cache.stats()['hits'], 1)
+
+    def test_400_unknown_signing_key(self):
+        res = self.get(rotated_key.token(self.auth, permissions=['patch:drinks']))
+        self.assertEqual(res.status_code, 400)
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
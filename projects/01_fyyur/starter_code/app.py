@@ -4,10 +4,11 @@
 
 import json
 import sys
+from itertools import groupby
 
 import dateutil.parser
 import babel
-from flask import Flask, render_template, request, Response, flash, redirect, url_for
+from flask import Flask, render_template, request, Response, flash, redirect, url_for, abort
 from flask_migrate import Migrate
 from flask_moment import Moment
 from flask_sqlalchemy import SQLAlchemy
@@ -19,7 +20,10 @@ from forms import *
 # ----------------------------------------------------------------------------#
 # App Config.
 # ----------------------------------------------------------------------------#
-from sqlalchemy import types
+from sqlalchemy import func, types
+from sqlalchemy.ext.associationproxy import association_proxy
+
+from search import SearchService
 
 app = Flask(__name__)
 moment = Moment(app)
@@ -28,11 +32,49 @@ db = SQLAlchemy(app)
 
 migrate = Migrate(app, db)
 
+SHOWS_PER_PAGE = 30
+
 
 # ----------------------------------------------------------------------------#
 # Models.
 # ----------------------------------------------------------------------------#
 
+venue_genre = db.Table(
+    'venue_genre',
+    db.Column('venue_id', db.Integer, db.ForeignKey('venue.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('genre_id', db.Integer, db.ForeignKey('genre.id', ondelete='CASCADE'), primary_key=True),
+    # browse by genre: the venues of a genre
+    db.Index('ix_venue_genre_genre_id_venue_id', 'genre_id', 'venue_id')
+)
+
+artist_genre = db.Table(
+    'artist_genre',
+    db.Column('artist_id', db.Integer, db.ForeignKey('artist.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('genre_id', db.Integer, db.ForeignKey('genre.id', ondelete='CASCADE'), primary_key=True),
+    # browse by genre: the artists of a genre
+    db.Index('ix_artist_genre_genre_id_artist_id', 'genre_id', 'artist_id')
+)
+
+
+class Genre(db.Model):
+    __tablename__ = 'genre'
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(120), nullable=False, unique=True)
+
+    @classmethod
+    def named(cls, name):
+        # Get the genre with the given name, or a new one added to the session.
+        genre = cls.query.filter_by(name=name).first()
+        if genre is None:
+            genre = cls(name=name)
+            db.session.add(genre)
+        return genre
+
+    def __repr__(self):
+        return f'<Genre {self.id} {self.name}>'
+
+
 class Venue(db.Model):
     __tablename__ = 'venue'
 
@@ -44,12 +86,20 @@ class Venue(db.Model):
     phone = db.Column(db.String(120))
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120))
-    genres = db.Column(db.PickleType, nullable=False)
+    genre_list = db.relationship('Genre', secondary=venue_genre, order_by='Genre.name')
+    # the genre names, read and assigned as a list of strings
+    genres = association_proxy('genre_list', 'name', creator=Genre.named)
     seeking_talent = db.Column(db.Boolean, default=False)
     seeking_description = db.Column(db.String(500))
     website = db.Column(db.String(120))
     show = db.relationship('Show', backref='venue', lazy=True)
 
+    # Search by "City, ST". The name search is served by a pg_trgm GIN index
+    # on Postgres, created by the migrations.
+    __table_args__ = (
+        db.Index('ix_venue_state_city', 'state', 'city'),
+    )
+
     def __repr__(self):
         return f'<Venue {self.id} {self.name} {self.city} {self.state} ' \
                f'{self.address} {self.phone} {self.image_link} ' \
@@ -66,7 +116,9 @@ class Artist(db.Model):
     city = db.Column(db.String(120), nullable=False)
     state = db.Column(db.String(120))
     phone = db.Column(db.String(120))
-    genres = db.Column(db.PickleType, nullable=False)
+    genre_list = db.relationship('Genre', secondary=artist_genre, order_by='Genre.name')
+    # the genre names, read and assigned as a list of strings
+    genres = association_proxy('genre_list', 'name', creator=Genre.named)
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120))
     seeking_venue = db.Column(db.Boolean, default=False)
@@ -74,6 +126,12 @@ class Artist(db.Model):
     website = db.Column(db.String(120))
     show = db.relationship('Show', backref='artist', lazy=True)
 
+    # Search by "City, ST". The name search is served by a pg_trgm GIN index
+    # on Postgres, created by the migrations.
+    __table_args__ = (
+        db.Index('ix_artist_state_city', 'state', 'city'),
+    )
+
     def __repr__(self):
         return f'<Artist {self.id} {self.name} {self.city} {self.state} ' \
                f'{self.phone} {self.genres} {self.image_link} ' \
@@ -88,13 +146,23 @@ class Show(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     venue_id = db.Column(db.Integer, db.ForeignKey('venue.id'))
     artist_id = db.Column(db.Integer, db.ForeignKey('artist.id'))
-    start_time = db.Column(db.DateTime)
+    start_time = db.Column(db.DateTime, index=True)
+
+    # The shows of a venue / of an artist, in start time order.
+    __table_args__ = (
+        db.Index('ix_show_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_show_artist_id_start_time', 'artist_id', 'start_time'),
+    )
 
     def __repr__(self):
         return f'<{self.id} {self.venue_id} {self.artist_id} ' \
                f'{self.start_time}>'
 
 
+venue_search = SearchService(Venue, db)
+artist_search = SearchService(Artist, db)
+
+
 # ----------------------------------------------------------------------------#
 # Filters.
 # ----------------------------------------------------------------------------#
@@ -111,6 +179,44 @@ def format_datetime(value, format='medium'):
 app.jinja_env.filters['datetime'] = format_datetime
 
 
+def partition_shows(shows, now):
+    """Splits (start_time, show) pairs into past and upcoming shows, in one pass.
+
+    A show starting at `now` or later is upcoming.
+    """
+    past_shows = []
+    upcoming_shows = []
+    for start_time, show in shows:
+        if start_time < now:
+            past_shows.append(show)
+        else:
+            upcoming_shows.append(show)
+    return past_shows, upcoming_shows
+
+
+# Joins the genre names of a venue / artist into one column.
+GENRE_SEPARATOR = '\x1f'
+
+
+def genre_names(link_table, owner):
+    """A correlated subquery of the genre names of each `owner` (Venue or
+    Artist) row, joined by GENRE_SEPARATOR, for split_genres()."""
+    if db.engine.dialect.name == 'postgresql':
+        names = func.string_agg(Genre.name, GENRE_SEPARATOR)
+    else:
+        names = func.group_concat(Genre.name, GENRE_SEPARATOR)
+    owner_id = link_table.c[owner.__tablename__ + '_id']
+    return db.session.query(names).\
+        join(link_table, link_table.c.genre_id == Genre.id).\
+        filter(owner_id == owner.id).\
+        correlate(owner).\
+        as_scalar()
+
+
+def split_genres(names):
+    return sorted(names.split(GENRE_SEPARATOR)) if names else []
+
+
 # ----------------------------------------------------------------------------#
 # Controllers.
 # ----------------------------------------------------------------------------#
@@ -125,91 +231,86 @@ def index():
 
 @app.route('/venues')
 def venues():
+    # Count the upcoming shows of every venue in one aggregate.
+    upcoming_shows = db.session.query(Show.venue_id, db.func.count(Show.id).label('num_upcoming_shows')).\
+        filter(Show.start_time >= datetime.utcnow()).\
+        group_by(Show.venue_id).\
+        subquery()
+
+    # Get all the venues, ordered by area, with only the columns the page shows.
+    venue_query = db.session.query(Venue.id, Venue.name, Venue.city, Venue.state,
+                                   db.func.coalesce(upcoming_shows.c.num_upcoming_shows, 0)).\
+        outerjoin(upcoming_shows, upcoming_shows.c.venue_id == Venue.id).\
+        order_by(Venue.state, Venue.city, Venue.name)
+
+    # Browse by genre, through the genre name & venue_genre indexes.
+    genre = request.args.get('genre')
+    if genre:
+        venue_query = venue_query.\
+            join(venue_genre, venue_genre.c.venue_id == Venue.id).\
+            join(Genre, Genre.id == venue_genre.c.genre_id).\
+            filter(Genre.name == genre)
+    venue_list = venue_query.all()
+
     data = []
-    venue_list = Venue.query.distinct('state', 'city').all()
-    for venue in venue_list:
-        venue_data = {
-            "city": venue.city,
-            "state": venue.state,
-            "venues": Venue.query.filter_by(city=venue.city).all()
-        }
-        data.append(venue_data)
+    for (state, city), area_venues in groupby(venue_list, key=lambda venue: (venue.state, venue.city)):
+        data.append({
+            "city": city,
+            "state": state,
+            "venues": [{
+                "id": venue_id,
+                "name": name,
+                "num_upcoming_shows": num_upcoming_shows
+            } for venue_id, name, _, _, num_upcoming_shows in area_venues]
+        })
 
-    return render_template('pages/venues.html', areas=data);
+    return render_template('pages/venues.html', areas=data, genre=genre)
 
 
-@app.route('/venues/search', methods=['POST'])
+@app.route('/venues/search', methods=['GET', 'POST'])
 def search_venues():
 
-    # Get the searched venue term
-    search_venue_term = request.form.get('search_term', '')
-
-    # Get all the venues from venue's table filtered by searched venue_term
-    searched_venues_list = Venue.query.filter(Venue.name.ilike(f'%{search_venue_term}%')).all()
-
-    # Get the found resorts count.
-    venues_count = len(searched_venues_list)
+    # Get the searched venue term, a part of a venue name or "City, ST".
+    search_term = request.values.get('search_term', '')
+    page = max(request.values.get('page', 1, type=int), 1)
 
-    data = []
-    for venue in searched_venues_list:
-        data.append(venue)
-        response = {
-            "count": venues_count,
-            "data": data
-        }
+    # Get a page of the matching venues, best matches first.
+    results = venue_search.search(search_term, page)
 
-    return render_template('pages/search_venues.html', results=response,
-                           search_term=request.form.get('search_term', ''))
+    return render_template('pages/search_venues.html', results=results,
+                           search_term=search_term)
 
 
 @app.route('/venues/<int:venue_id>')
 def show_venue(venue_id):
 
-    venue = Venue.query.filter_by(id=venue_id).first()
-
-    # Get the past show & artist details for the given venue.
-    old_shows = Artist.query.with_entities(Artist.id, Artist.name, Artist.image_link, Show.start_time).\
-        join(Show, Artist.id == Show.artist_id).\
-        join(Venue, Venue.id == Show.venue_id).\
+    # Get the venue with its genre names, all its shows & their artist details in one query.
+    rows = db.session.query(Venue, genre_names(venue_genre, Venue),
+                            Show.start_time, Artist.id, Artist.name, Artist.image_link).\
+        outerjoin(Show, Show.venue_id == Venue.id).\
+        outerjoin(Artist, Artist.id == Show.artist_id).\
         filter(Venue.id == venue_id).\
-        filter(Show.start_time < datetime.utcnow()).\
+        order_by(Show.start_time).\
         all()
 
-    p_shows = []
-    for p_show in old_shows:
-        prev_show = {
-            "artist_id": p_show.id,
-            "artist_name": p_show.name,
-            "artist_image_link": p_show.image_link,
-            "start_time": p_show.start_time.strftime("%d %b %Y %H:%M:%S.%f")
-        }
-        p_shows.append(prev_show)
-
-    # Get the future show & artist details for the given venue.
-    future_shows = Artist.query.with_entities(Artist.id, Artist.name, Artist.image_link, Show.start_time).\
-        join(Show, Artist.id == Show.artist_id).\
-        join(Venue, Venue.id == Show.venue_id).\
-        filter(Venue.id == venue_id).\
-        filter(Show.start_time >= datetime.utcnow()).\
-        all()
+    if not rows:
+        abort(404)
+    venue, genres = rows[0][0], split_genres(rows[0][1])
 
-    f_shows = []
-    for f_show in future_shows:
-        future_show = {
-            "artist_id": f_show.id,
-            "artist_name": f_show.name,
-            "artist_image_link": f_show.image_link,
-            "start_time": f_show.start_time.strftime("%d %b %Y %H:%M:%S.%f")
-        }
-        f_shows.append(future_show)
-
-    # Get the upcoming shows count
-    upcoming_shows_count = Show.query.filter(Show.venue_id == venue_id, Show.start_time > datetime.utcnow()).count()
+    # Split the shows into past & upcoming ones against a single timestamp.
+    p_shows, f_shows = partition_shows((
+        (start_time, {
+            "artist_id": artist_id,
+            "artist_name": artist_name,
+            "artist_image_link": artist_image_link,
+            "start_time": start_time.strftime("%d %b %Y %H:%M:%S.%f")
+        }) for _, _, start_time, artist_id, artist_name, artist_image_link in rows
+        if start_time is not None), datetime.utcnow())
 
     data = {
         "id": venue.id,
         "name": venue.name,
-        "genres": venue.genres,
+        "genres": genres,
         "address": venue.address,
         "city": venue.city,
         "state": venue.state,
@@ -222,7 +323,7 @@ def show_venue(venue_id):
         "past_shows": p_shows,
         "upcoming_shows": f_shows,
         "past_shows_count": len(p_shows),
-        "upcoming_shows_count": upcoming_shows_count
+        "upcoming_shows_count": len(f_shows)
     }
 
     return render_template('pages/show_venue.html', venue=data)
@@ -251,6 +352,7 @@ def create_venue_submission():
                       facebook_link=facebook_link)
         db.session.add(venue)
         db.session.commit()
+        venue_search.invalidate()
         flash('Venue ' + request.form['name'] + ' was successfully listed!')
     except:
         error = True
@@ -269,6 +371,7 @@ def delete_venue(venue_id):
     try:
         Venue.query.filter_by(id=venue_id).delete()
         db.session.commit()
+        venue_search.invalidate()
         flash('Venue ' + venue_id + ' was successfully Deleted')
     except:
         error = True
@@ -285,72 +388,58 @@ def delete_venue(venue_id):
 #  ----------------------------------------------------------------
 @app.route('/artists')
 def artists():
-    data = Artist.query.all()
-    return render_template('pages/artists.html', artists=data)
+    artist_query = db.session.query(Artist.id, Artist.name).order_by(Artist.name)
+
+    # Browse by genre, through the genre name & artist_genre indexes.
+    genre = request.args.get('genre')
+    if genre:
+        artist_query = artist_query.\
+            join(artist_genre, artist_genre.c.artist_id == Artist.id).\
+            join(Genre, Genre.id == artist_genre.c.genre_id).\
+            filter(Genre.name == genre)
+
+    return render_template('pages/artists.html', artists=artist_query.all(), genre=genre)
 
 
-@app.route('/artists/search', methods=['POST'])
+@app.route('/artists/search', methods=['GET', 'POST'])
 def search_artists():
-    search_artist_term = request.form.get('search_term', '')
-    searched_artist_list = Artist.query.filter(Artist.name.ilike(f'%{search_artist_term}%')).all()
-    artist_count = len(searched_artist_list)
-    data = []
-    for artist in searched_artist_list:
-        data.append(artist)
-        response = {
-            "count": artist_count,
-            "data": data
-        }
-    return render_template('pages/search_artists.html', results=response,
-                           search_term=request.form.get('search_term', ''))
+    search_term = request.values.get('search_term', '')
+    page = max(request.values.get('page', 1, type=int), 1)
+    results = artist_search.search(search_term, page)
+    return render_template('pages/search_artists.html', results=results,
+                           search_term=search_term)
 
 
 @app.route('/artists/<int:artist_id>')
 def show_artist(artist_id):
-    artist = Artist.query.filter_by(id=artist_id).first()
-
-    old_shows = Venue.query.with_entities(Venue.id, Venue.name, Venue.image_link, Show.start_time).\
-        join(Show,Venue.id == Show.venue_id).\
-        join(Artist, Artist.id == Show.artist_id).\
-        filter(Artist.id == artist_id).\
-        filter(Show.start_time < datetime.utcnow()).all()
 
-    p_shows = []
-
-    for p_show in old_shows:
-        prev_show = {
-            "venue_id": p_show.id,
-            "venue_name": p_show.name,
-            "venue_image_link": p_show.image_link,
-            "start_time": p_show.start_time.strftime("%d %b %Y %H:%M:%S.%f")
-        }
-        p_shows.append(prev_show)
-
-    future_shows = Venue.query.with_entities(Venue.id, Venue.name, Venue.image_link, Show.start_time).\
-        join(Show, Venue.id == Show.venue_id).\
-        join(Artist, Artist.id == Show.artist_id).\
+    # Get the artist with its genre names, all its shows & their venue details in one query.
+    rows = db.session.query(Artist, genre_names(artist_genre, Artist),
+                            Show.start_time, Venue.id, Venue.name, Venue.image_link).\
+        outerjoin(Show, Show.artist_id == Artist.id).\
+        outerjoin(Venue, Venue.id == Show.venue_id).\
         filter(Artist.id == artist_id).\
-        filter(Show.start_time >= datetime.utcnow()).all()
-
-    print(future_shows)
-    print(len(future_shows))
+        order_by(Show.start_time).\
+        all()
 
-    f_shows = []
+    if not rows:
+        abort(404)
+    artist, genres = rows[0][0], split_genres(rows[0][1])
 
-    for f_show in future_shows:
-        print(f_show.id, f_show.name, f_show.image_link, f_show.start_time)
-        future_show = {
-            "venue_id": f_show.id,
-            "venue_name": f_show.name,
-            "venue_image_link": f_show.image_link,
-            "start_time": f_show.start_time.strftime("%d %b %Y %H:%M:%S.%f")
-        }
-        f_shows.append(future_show)
+    # Split the shows into past & upcoming ones against a single timestamp.
+    p_shows, f_shows = partition_shows((
+        (start_time, {
+            "venue_id": venue_id,
+            "venue_name": venue_name,
+            "venue_image_link": venue_image_link,
+            "start_time": start_time.strftime("%d %b %Y %H:%M:%S.%f")
+        }) for _, _, start_time, venue_id, venue_name, venue_image_link in rows
+        if start_time is not None), datetime.utcnow())
 
     data = {
         "id": artist.id,
         "name": artist.name,
-        "genres": artist.genres,
+        "genres": genres,
         "city": artist.city,
         "state": artist.state,
         "phone": artist.phone,
@@ -362,8 +451,7 @@ def show_artist(artist_id):
         "past_shows": p_shows,
         "upcoming_shows": f_shows,
         "past_shows_count": len(p_shows),
-        "upcoming_shows_count": Show.query.filter(Show.artist_id == artist_id,Show.start_time > datetime.utcnow()).count()
-
+        "upcoming_shows_count": len(f_shows)
     }
     return render_template('pages/show_artist.html', artist=data)
 
@@ -427,6 +515,7 @@ def edit_artist_submission(artist_id):
             artist.website = website
 
         db.session.commit()
+        artist_search.invalidate()
 
         flash('Artist ' + request.form['name'] + ' was successfully updated!')
     except:
@@ -503,6 +592,7 @@ def edit_venue_submission(venue_id):
             venue.website = website
 
         db.session.commit()
+        venue_search.invalidate()
 
         flash('Venue ' + request.form['name'] + ' was successfully updated!')
 
@@ -544,6 +634,7 @@ def create_artist_submission():
 
         db.session.add(artist)
         db.session.commit()
+        artist_search.invalidate()
         flash('Artist ' + request.form['name'] + ' was successfully listed!')
     except:
         error = True
@@ -561,22 +652,35 @@ def create_artist_submission():
 
 @app.route('/shows')
 def shows():
-    # displays list of shows at /shows
+    # displays list of shows at /shows, SHOWS_PER_PAGE at a time
+    page = max(request.args.get('page', 1, type=int), 1)
+
+    # Get the shows of the page with their venue & artist in one query,
+    # in start time order (served by the index on show.start_time).
+    # One extra row tells whether there is a next page.
+    show_list = db.session.query(Show.start_time, Venue.id, Venue.name,
+                                 Artist.id, Artist.name, Artist.image_link).\
+        join(Venue, Venue.id == Show.venue_id).\
+        join(Artist, Artist.id == Show.artist_id).\
+        order_by(Show.start_time, Show.id).\
+        offset((page - 1) * SHOWS_PER_PAGE).\
+        limit(SHOWS_PER_PAGE + 1).\
+        all()
+
     data = []
-    shows = Show.query.all()
-    for show in shows:
-        venue = Venue.query.filter_by(id=show.venue_id).first()
-        artist = Artist.query.filter_by(id=show.artist_id).first()
-        data1 = {
-            "venue_id": venue.id,
-            "venue_name": venue.name,
-            "artist_id": artist.id,
-            "artist_name": artist.name,
-            "artist_image_link": artist.image_link,
-            "start_time": show.start_time.strftime("%d %b %Y %H:%M:%S.%f")
-        }
-        data.append(data1)
-    return render_template('pages/shows.html', shows=data)
+    for start_time, venue_id, venue_name, artist_id, artist_name, artist_image_link in show_list[:SHOWS_PER_PAGE]:
+        data.append({
+            "venue_id": venue_id,
+            "venue_name": venue_name,
+            "artist_id": artist_id,
+            "artist_name": artist_name,
+            "artist_image_link": artist_image_link,
+            "start_time": start_time.strftime("%d %b %Y %H:%M:%S.%f")
+        })
+
+    return render_template('pages/shows.html', shows=data,
+                           prev_page=page - 1 if page > 1 else None,
+                           next_page=page + 1 if len(show_list) > SHOWS_PER_PAGE else None)
 
 
 @app.route('/shows/create')
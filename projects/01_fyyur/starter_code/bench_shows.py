@@ -0,0 +1,94 @@
+"""Query count and latency of the /shows page, per-row lookups versus
+the joined query.
+
+Seeds a temporary SQLite database with synthetic venues, artists and
+shows, then compares the previous implementation of the page (every show,
+then a venue and an artist query per show) with the current view.
+
+    python bench_shows.py [shows]
+"""
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+from app import app, db, Venue, Artist, Show, SHOWS_PER_PAGE
+
+BATCH = 10000
+
+
+def seed(shows):
+    venues = max(shows // 20, 1)
+    artists = max(shows // 10, 1)
+    db.session.execute(Venue.__table__.insert(), [
+        {'name': 'Venue %d' % i, 'city': 'City %d' % (i % 50), 'state': 'CA',
+         'address': '%d Main St' % i}
+        for i in range(1, venues + 1)])
+    db.session.execute(Artist.__table__.insert(), [
+        {'name': 'Artist %d' % i, 'city': 'City %d' % (i % 50), 'state': 'CA',
+         'image_link': 'https://example.com/%d.jpg' % i}
+        for i in range(1, artists + 1)])
+    start = datetime(2020, 1, 1)
+    for first in range(0, shows, BATCH):
+        db.session.execute(Show.__table__.insert(), [
+            {'venue_id': i % venues + 1, 'artist_id': i % artists + 1,
+             'start_time': start + timedelta(hours=(i * 7919) % shows)}
+            for i in range(first, min(first + BATCH, shows))])
+    db.session.commit()
+
+
+def shows_per_row():
+    # the /shows page before the joined query
+    data = []
+    for show in Show.query.all():
+        venue = Venue.query.filter_by(id=show.venue_id).first()
+        artist = Artist.query.filter_by(id=show.artist_id).first()
+        data.append({
+            "venue_id": venue.id,
+            "venue_name": venue.name,
+            "artist_id": artist.id,
+            "artist_name": artist.name,
+            "artist_image_link": artist.image_link,
+            "start_time": show.start_time.strftime("%d %b %Y %H:%M:%S.%f")
+        })
+    return data
+
+
+def measure(func):
+    queries = []
+
+    def count(*args):
+        queries.append(args[2])
+
+    event.listen(db.engine, 'before_cursor_execute', count)
+    started = time.perf_counter()
+    try:
+        func()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', count)
+    return len(queries), (time.perf_counter() - started) * 1000
+
+
+def main(shows=10000):
+    with tempfile.TemporaryDirectory() as tmp:
+        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(tmp, 'bench.db')
+        client = app.test_client()
+        with app.app_context():
+            db.create_all()
+            seed(shows)
+
+            pages = (shows + SHOWS_PER_PAGE - 1) // SHOWS_PER_PAGE
+            print('%-28s %10s %12s' % ('', 'queries', 'ms'))
+            print('%-28s %10d %12.1f' % (('per-row lookups, all shows',) + measure(shows_per_row)))
+            for page in (1, pages // 2, pages):
+                label = 'joined query, page %d' % page
+                print('%-28s %10d %12.1f' % ((label,) + measure(
+                    lambda: client.get('/shows?page=%d' % page))))
+            db.session.remove()
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:2]])
@@ -0,0 +1,78 @@
+"""fyyur schema
+
+Revision ID: 3b9d6e2a7f14
+Revises: 
+Create Date: 2026-10-18 03:12:40.517203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3b9d6e2a7f14'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # databases created before the migrations were kept in the repository
+    # already have the tables
+    inspector = sa.inspect(op.get_bind())
+    tables = inspector.get_table_names()
+    if 'venue' not in tables:
+        op.create_table('venue',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('name', sa.String(), nullable=False),
+            sa.Column('city', sa.String(length=120), nullable=False),
+            sa.Column('state', sa.String(length=120), nullable=False),
+            sa.Column('address', sa.String(length=120), nullable=False),
+            sa.Column('phone', sa.String(length=120), nullable=True),
+            sa.Column('image_link', sa.String(length=500), nullable=True),
+            sa.Column('facebook_link', sa.String(length=120), nullable=True),
+            sa.Column('genres', sa.PickleType(), nullable=False),
+            sa.Column('seeking_talent', sa.Boolean(), nullable=True),
+            sa.Column('seeking_description', sa.String(length=500), nullable=True),
+            sa.Column('website', sa.String(length=120), nullable=True),
+            sa.PrimaryKeyConstraint('id')
+        )
+    if 'artist' not in tables:
+        op.create_table('artist',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('name', sa.String(), nullable=False),
+            sa.Column('city', sa.String(length=120), nullable=False),
+            sa.Column('state', sa.String(length=120), nullable=True),
+            sa.Column('phone', sa.String(length=120), nullable=True),
+            sa.Column('genres', sa.PickleType(), nullable=False),
+            sa.Column('image_link', sa.String(length=500), nullable=True),
+            sa.Column('facebook_link', sa.String(length=120), nullable=True),
+            sa.Column('seeking_venue', sa.Boolean(), nullable=True),
+            sa.Column('seeking_description', sa.String(length=500), nullable=True),
+            sa.Column('website', sa.String(length=120), nullable=True),
+            sa.PrimaryKeyConstraint('id')
+        )
+    if 'show' not in tables:
+        op.create_table('show',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('venue_id', sa.Integer(), nullable=True),
+            sa.Column('artist_id', sa.Integer(), nullable=True),
+            sa.Column('start_time', sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(['artist_id'], ['artist.id'], ),
+            sa.ForeignKeyConstraint(['venue_id'], ['venue.id'], ),
+            sa.PrimaryKeyConstraint('id')
+        )
+
+    indexes = {index['name'] for index in sa.inspect(op.get_bind()).get_indexes('show')}
+    if 'ix_show_start_time' not in indexes:
+        op.create_index('ix_show_start_time', 'show', ['start_time'], unique=False)
+    if 'ix_show_venue_id_start_time' not in indexes:
+        op.create_index('ix_show_venue_id_start_time', 'show', ['venue_id', 'start_time'], unique=False)
+    if 'ix_show_artist_id_start_time' not in indexes:
+        op.create_index('ix_show_artist_id_start_time', 'show', ['artist_id', 'start_time'], unique=False)
+
+
+def downgrade():
+    op.drop_table('show')
+    op.drop_table('artist')
+    op.drop_table('venue')
@@ -0,0 +1,40 @@
+"""search indexes
+
+Revision ID: 7c3f5a9e1d62
+Revises: e41c0a8d5b27
+Create Date: 2026-10-18 05:41:27.530914
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c3f5a9e1d62'
+down_revision = 'e41c0a8d5b27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # "City, ST" searches.
+    op.create_index('ix_venue_state_city', 'venue', ['state', 'city'])
+    op.create_index('ix_artist_state_city', 'artist', ['state', 'city'])
+
+    # Name searches ('%term%') through a trigram index, on Postgres only.
+    # Elsewhere the app searches an in-memory index of the names.
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        op.create_index('ix_venue_name_trgm', 'venue', ['name'],
+                        postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+        op.create_index('ix_artist_name_trgm', 'artist', ['name'],
+                        postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.drop_index('ix_artist_name_trgm', table_name='artist')
+        op.drop_index('ix_venue_name_trgm', table_name='venue')
+
+    op.drop_index('ix_artist_state_city', table_name='artist')
+    op.drop_index('ix_venue_state_city', table_name='venue')
@@ -0,0 +1,109 @@
+"""normalize genres
+
+Revision ID: e41c0a8d5b27
+Revises: 3b9d6e2a7f14
+Create Date: 2026-10-18 03:20:06.118342
+
+"""
+import io
+import pickle
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e41c0a8d5b27'
+down_revision = '3b9d6e2a7f14'
+branch_labels = None
+depends_on = None
+
+genre = sa.table('genre', sa.column('id', sa.Integer), sa.column('name', sa.String))
+entities = {
+    'venue': sa.table('venue', sa.column('id', sa.Integer), sa.column('genres', sa.LargeBinary)),
+    'artist': sa.table('artist', sa.column('id', sa.Integer), sa.column('genres', sa.LargeBinary)),
+}
+
+
+class GenresUnpickler(pickle.Unpickler):
+    # The genres were pickled lists of strings, which load without looking
+    # up any class. Anything else is refused instead of being run.
+    def find_class(self, module, name):
+        raise pickle.UnpicklingError(f'unexpected {module}.{name} in pickled genres')
+
+
+def load_genres(blob):
+    if blob is None:
+        return []
+    genres = GenresUnpickler(io.BytesIO(blob)).load()
+    if isinstance(genres, str):
+        genres = [genres]
+    # drop duplicates, keep the order
+    return list(dict.fromkeys(str(name) for name in genres))
+
+
+def upgrade():
+    op.create_table('genre',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=120), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('name')
+    )
+    for entity in ('venue', 'artist'):
+        op.create_table(f'{entity}_genre',
+            sa.Column(f'{entity}_id', sa.Integer(), nullable=False),
+            sa.Column('genre_id', sa.Integer(), nullable=False),
+            sa.ForeignKeyConstraint(['genre_id'], ['genre.id'], ondelete='CASCADE'),
+            sa.ForeignKeyConstraint([f'{entity}_id'], [f'{entity}.id'], ondelete='CASCADE'),
+            sa.PrimaryKeyConstraint(f'{entity}_id', 'genre_id')
+        )
+        op.create_index(f'ix_{entity}_genre_genre_id_{entity}_id', f'{entity}_genre',
+                        ['genre_id', f'{entity}_id'], unique=False)
+
+    # Move the pickled genres into the genre & association tables.
+    bind = op.get_bind()
+    entity_genres = {
+        entity: [(entity_id, load_genres(blob))
+                 for entity_id, blob in bind.execute(sa.select([table.c.id, table.c.genres])).fetchall()]
+        for entity, table in entities.items()
+    }
+    names = sorted({name for rows in entity_genres.values() for _, genres in rows for name in genres})
+    if names:
+        bind.execute(genre.insert(), [{'name': name} for name in names])
+    genre_ids = dict(bind.execute(sa.select([genre.c.name, genre.c.id])).fetchall())
+
+    for entity, rows in entity_genres.items():
+        links = [{f'{entity}_id': entity_id, 'genre_id': genre_ids[name]}
+                 for entity_id, genres in rows for name in genres]
+        if links:
+            link_table = sa.table(f'{entity}_genre', sa.column(f'{entity}_id', sa.Integer),
+                                  sa.column('genre_id', sa.Integer))
+            bind.execute(link_table.insert(), links)
+
+        with op.batch_alter_table(entity, schema=None) as batch_op:
+            batch_op.drop_column('genres')
+
+
+def downgrade():
+    bind = op.get_bind()
+    for entity, table in entities.items():
+        with op.batch_alter_table(entity, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('genres', sa.PickleType(), nullable=True))
+
+        link_table = sa.table(f'{entity}_genre', sa.column(f'{entity}_id', sa.Integer),
+                              sa.column('genre_id', sa.Integer))
+        genres = {}
+        for entity_id, name in bind.execute(
+                sa.select([link_table.c[f'{entity}_id'], genre.c.name]).
+                select_from(link_table.join(genre, genre.c.id == link_table.c.genre_id))):
+            genres.setdefault(entity_id, []).append(name)
+        for (entity_id,) in bind.execute(sa.select([table.c.id])):
+            bind.execute(table.update().where(table.c.id == entity_id).
+                         values(genres=pickle.dumps(genres.get(entity_id, []))))
+
+        with op.batch_alter_table(entity, schema=None) as batch_op:
+            batch_op.alter_column('genres', existing_type=sa.PickleType(), nullable=False)
+
+        op.drop_index(f'ix_{entity}_genre_genre_id_{entity}_id', table_name=f'{entity}_genre')
+        op.drop_table(f'{entity}_genre')
+    op.drop_table('genre')
@@ -0,0 +1,205 @@
+import re
+import threading
+import time
+from collections import namedtuple
+
+from sqlalchemy import case, func
+
+# ----------------------------------------------------------------------------#
+# Search for venues & artists.
+# ----------------------------------------------------------------------------#
+
+SEARCH_PER_PAGE = 20
+# matches counted past this number are reported as "more than"
+SEARCH_MAX_COUNT = 1000
+# seconds after which the in-memory index reloads, to see other processes' writes
+SEARCH_INDEX_TTL = 300
+
+# "San Francisco, CA"
+LOCATION = re.compile(r'^\s*([^,]+?)\s*,\s*([A-Za-z]{2})\s*$')
+
+# a search result, like the (id, name) rows of the Postgres search
+Match = namedtuple('Match', 'id name')
+
+
+def parse_location(term):
+    """Returns (city, state) for a "City, ST" search term, None otherwise."""
+    match = LOCATION.match(term)
+    if match is None:
+        return None
+    return match.group(1), match.group(2).upper()
+
+
+def trigrams(text):
+    """The trigrams inside the words of `text`. A name contains a term only
+    if it has all of the term's trigrams, as for pg_trgm's LIKE support."""
+    grams = set()
+    for word in re.findall(r'\w+', text.lower()):
+        grams.update(word[i:i + 3] for i in range(len(word) - 2))
+    return grams
+
+
+def rank(name, term):
+    """Sort key of a name matching `term`: exact, prefix, word prefix, then
+    any other substring match."""
+    name = name.lower()
+    if name == term:
+        return 0
+    if name.startswith(term):
+        return 1
+    if f' {term}' in name:
+        return 2
+    return 3
+
+
+class SearchResults:
+    """A page of search results: `data` holds the (id, name) matches of the
+    page, `count` the number of matches, capped at SEARCH_MAX_COUNT (`capped`
+    is then True)."""
+
+    def __init__(self, data, count, capped, page, per_page):
+        self.data = data
+        self.count = count
+        self.capped = capped
+        self.page = page
+        self.prev_page = page - 1 if page > 1 else None
+        self.next_page = page + 1 if page * per_page < count else None
+
+
+class NgramIndex:
+    """In-memory trigram index over the names and locations of one model,
+    the search backend used when the database is not Postgres.
+
+    A name matches when it contains the term (case-insensitive), the
+    trigram postings narrow the names to check down. Loaded on first use,
+    emptied by invalidate() when the model is written to.
+    """
+
+    def __init__(self, model, ttl=SEARCH_INDEX_TTL, clock=time.monotonic):
+        self.model = model
+        self.ttl = ttl
+        self.clock = clock
+        self._names = None
+        self._postings = None
+        self._locations = None
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def _ensure_loaded(self):
+        if self._loaded_at is not None and self.clock() - self._loaded_at < self.ttl:
+            return
+        model = self.model
+        rows = model.query.with_entities(model.id, model.name, model.city, model.state).all()
+        names = {}
+        postings = {}
+        locations = {}
+        for row_id, name, city, state in rows:
+            names[row_id] = name
+            for gram in trigrams(name):
+                postings.setdefault(gram, set()).add(row_id)
+            locations.setdefault(((city or '').lower(), (state or '').upper()), []).append(row_id)
+        with self._lock:
+            self._names, self._postings, self._locations = names, postings, locations
+            self._loaded_at = self.clock()
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded_at = None
+
+    def _by_name(self, term):
+        term = term.lower()
+        candidates = None
+        for gram in trigrams(term):
+            ids = self._postings.get(gram, set())
+            candidates = ids if candidates is None else candidates & ids
+            if not candidates:
+                return []
+        if candidates is None:
+            # no word of three letters, every name is a candidate
+            candidates = self._names
+        names = self._names
+        matches = [(names[row_id], row_id) for row_id in candidates
+                   if term in names[row_id].lower()]
+        matches.sort(key=lambda match: (rank(match[0], term), match[0].lower(), match[1]))
+        return [Match(row_id, name) for name, row_id in matches]
+
+    def _by_location(self, city, state):
+        names = self._names
+        ids = self._locations.get((city.lower(), state), [])
+        return sorted((Match(row_id, names[row_id]) for row_id in ids),
+                      key=lambda match: (match.name.lower(), match.id))
+
+    def search(self, term, page=1, per_page=SEARCH_PER_PAGE, max_count=SEARCH_MAX_COUNT):
+        self._ensure_loaded()
+        location = parse_location(term)
+        if location is not None:
+            matches = self._by_location(*location)
+        else:
+            matches = self._by_name(term.strip())
+        start = (page - 1) * per_page
+        count = min(len(matches), max_count)
+        return SearchResults(matches[start:start + per_page], count,
+                             len(matches) > max_count, page, per_page)
+
+
+class TrigramSearch:
+    """Postgres search over one model, served by the pg_trgm GIN index on
+    its name (see the migrations) and its (state, city) index. Results are
+    ranked and paginated in SQL."""
+
+    def __init__(self, model, db):
+        self.model = model
+        self.db = db
+
+    def invalidate(self):
+        pass
+
+    def search(self, term, page=1, per_page=SEARCH_PER_PAGE, max_count=SEARCH_MAX_COUNT):
+        model = self.model
+        location = parse_location(term)
+        query = self.db.session.query(model.id, model.name)
+        if location is not None:
+            city, state = location
+            query = query.filter(model.state == state, func.lower(model.city) == city.lower()).\
+                order_by(func.lower(model.name), model.id)
+        else:
+            term = term.strip()
+            lowered = term.lower()
+            query = query.filter(model.name.ilike(f'%{term}%')).\
+                order_by(case([(func.lower(model.name) == lowered, 0),
+                               (func.lower(model.name).startswith(lowered), 1)], else_=2),
+                         func.similarity(model.name, term).desc(),
+                         func.lower(model.name), model.id)
+
+        # count at most max_count + 1 rows rather than every match
+        matches = query.order_by(None).limit(max_count + 1).subquery()
+        count = self.db.session.query(func.count()).select_from(matches).scalar()
+
+        data = query.offset((page - 1) * per_page).limit(per_page).all()
+        return SearchResults(data, min(count, max_count), count > max_count, page, per_page)
+
+
+class SearchService:
+    """Search of one model by name or by "City, ST", backed by TrigramSearch
+    on Postgres and by an NgramIndex elsewhere (chosen on first use)."""
+
+    def __init__(self, model, db):
+        self.model = model
+        self.db = db
+        self._backend = None
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            if self.db.engine.dialect.name == 'postgresql':
+                self._backend = TrigramSearch(self.model, self.db)
+            else:
+                self._backend = NgramIndex(self.model)
+        return self._backend
+
+    def search(self, term, page=1):
+        return self.backend.search(term, page)
+
+    def invalidate(self):
+        if self._backend is not None:
+            self._backend.invalidate()
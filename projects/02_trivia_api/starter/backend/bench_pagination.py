@@ -0,0 +1,59 @@
+"""Deep-page latency of offset paging versus cursor (keyset) paging.
+
+Seeds a temporary SQLite database with synthetic questions, then times the
+page helpers of the trivia API at increasing depths.
+
+    python bench_pagination.py [questions]
+"""
+import os
+import sys
+import tempfile
+import time
+
+from flask import Flask, request
+
+from flaskr import (QUESTIONS_PER_PAGE, encode_cursor, paginate_questions,
+                    paginate_questions_by_cursor)
+from models import db, setup_db, Question
+
+REPEAT = 20
+
+
+def seed(questions):
+    db.session.execute(Question.__table__.insert(), [
+        {'question': 'question %d' % i, 'answer': 'answer %d' % i,
+         'category': i % 6 + 1, 'difficulty': i % 5 + 1}
+        for i in range(1, questions + 1)])
+    db.session.commit()
+
+
+def timed(func):
+    started = time.perf_counter()
+    for _ in range(REPEAT):
+        func()
+    return (time.perf_counter() - started) / REPEAT * 1000
+
+
+def main(questions=200000):
+    with tempfile.TemporaryDirectory() as tmp:
+        app = Flask(__name__)
+        setup_db(app, 'sqlite:///' + os.path.join(tmp, 'bench.db'))
+        with app.app_context():
+            seed(questions)
+
+            print('%10s %12s %12s' % ('page', 'offset ms', 'cursor ms'))
+            pages = questions // QUESTIONS_PER_PAGE
+            for page in (1, pages // 100, pages // 10, pages // 2, pages):
+                page = max(page, 1)
+                selection = Question.query.order_by(Question.id)
+                # the cursor a client would hold after reading page - 1 pages
+                cursor = encode_cursor((page - 1) * QUESTIONS_PER_PAGE)
+
+                with app.test_request_context('/questions?page=%d' % page):
+                    offset_ms = timed(lambda: paginate_questions(request, selection))
+                cursor_ms = timed(lambda: paginate_questions_by_cursor(cursor, selection))
+                print('%10d %12.2f %12.2f' % (page, offset_ms, cursor_ms))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:2]])
@@ -0,0 +1,89 @@
+"""Question search latency, ILIKE '%term%' scan versus the search index.
+
+Seeds a temporary SQLite database with a synthetic corpus of questions,
+then times a few searches through the previous ILIKE query, through the
+in-process inverted index and through the search result cache. Pass a
+Postgres URI to time the Postgres backend (tsvector and trigram indexes)
+instead; its table is left seeded.
+
+    python bench_search.py [questions] [database_uri]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+from flask import Flask
+
+from flaskr import QUESTIONS_PER_PAGE
+from flaskr.search import make_question_search
+from models import db, setup_db, Question
+
+REPEAT = 5
+BATCH = 50000
+WORDS = ('city river mountain painter novel planet element ocean king war '
+         'country capital museum scientist album desert island language '
+         'composer empire temple bridge festival orbit comet').split()
+TERMS = ('city', 'paint', 'comet orbit', 'island temple bridge', 'zzz')
+
+
+def seed(questions):
+    rng = random.Random(42)
+    for start in range(1, questions + 1, BATCH):
+        db.session.execute(Question.__table__.insert(), [
+            {'question': 'Which %s %s %d?' % tuple(rng.sample(WORDS, 2) + [i]),
+             'answer': 'answer %d' % i,
+             'category': i % 6 + 1, 'difficulty': i % 5 + 1}
+            for i in range(start, min(start + BATCH, questions + 1))])
+        db.session.commit()
+
+
+def timed(func):
+    started = time.perf_counter()
+    for _ in range(REPEAT):
+        result = func()
+    return (time.perf_counter() - started) / REPEAT * 1000, result
+
+
+def ilike(term):
+    selection = Question.query.order_by(Question.id).\
+        filter(Question.question.ilike('%{}%'.format(term)))
+    return selection.limit(QUESTIONS_PER_PAGE).all(), selection.count()
+
+
+def run(app, questions):
+    with app.app_context():
+        if not Question.query.first():
+            seed(questions)
+        cached_search = make_question_search(app.config)
+        question_search = cached_search.backend
+
+        started = time.perf_counter()
+        question_search.search('warmup', 0, 1)
+        print('index ready in %.0f ms' % ((time.perf_counter() - started) * 1000))
+
+        print('%22s %10s %12s %12s %12s' % ('term', 'matches', 'ilike ms', 'index ms', 'cached ms'))
+        for term in TERMS:
+            ilike_ms, _ = timed(lambda: ilike(term))
+            index_ms, (_, total) = timed(
+                lambda: question_search.search(term, 0, QUESTIONS_PER_PAGE))
+            cached_ms, _ = timed(
+                lambda: cached_search.search(term, 0, QUESTIONS_PER_PAGE))
+            print('%22s %10d %12.2f %12.2f %12.2f' % (term, total, ilike_ms, index_ms, cached_ms))
+
+
+def main(questions=1000000, database_uri=None):
+    app = Flask(__name__)
+    if database_uri:
+        setup_db(app, database_uri)
+        run(app, questions)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        setup_db(app, 'sqlite:///' + os.path.join(tmp, 'bench.db'))
+        run(app, questions)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:2]], *sys.argv[2:3])
@@ -1,29 +1,165 @@
-from flask import Flask, request, abort, jsonify, redirect, url_for
+import base64
+import json
+import os
+import random
+
+from flask import Flask, request, abort, jsonify
 from flask_cors import CORS
-from sqlalchemy import func
+from sqlalchemy.orm import Query
 
-from models import setup_db, Question, Category
+from models import database_path, setup_db, Question, category_registry, question_counts, question_index
+from flaskr.search import make_question_search
+from flaskr.sessions import SessionNotFound, make_session_store
 
 QUESTIONS_PER_PAGE = 10
+# largest question id (a Postgres integer) or offset a cursor may hold
+MAX_CURSOR_VALUE = 2 ** 31 - 1
 
 
-def paginate_categories(request, selection):
-    page = request.args.get('page', 1, type=int)
-    start = (page - 1) * QUESTIONS_PER_PAGE
-    end = start + QUESTIONS_PER_PAGE
+def paginate_questions(request, selection):
+    """Returns the formatted questions of the requested page.
 
-    questions = [question.format() for question in selection]
-    current_questions = questions[start:end]
+    `selection` is either a query, which is then limited to the page in SQL
+    (LIMIT/OFFSET), or an already loaded list of questions. Only the
+    questions of the page are formatted.
+    """
+    page = max(request.args.get('page', 1, type=int), 1)
+    start = (page - 1) * QUESTIONS_PER_PAGE
 
-    return current_questions
+    if isinstance(selection, Query):
+        current_questions = selection.offset(start).limit(QUESTIONS_PER_PAGE).all()
+    else:
+        current_questions = selection[start:start + QUESTIONS_PER_PAGE]
+
+    return [question.format() for question in current_questions]
+
+
+def encode_cursor(value, key='id'):
+    """Returns the opaque cursor pointing after the given question id
+    (or, with key='offset', after the given position of a ranked result)."""
+    raw = json.dumps({key: value}).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor, key='id'):
+    """Returns the value a cursor points after, 0 for an empty cursor.
+
+    Aborts with 400 when the cursor was not produced by encode_cursor.
+    """
+    if not cursor:
+        return 0
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        value = json.loads(raw)[key]
+    except (ValueError, TypeError, KeyError, OverflowError):
+        abort(400)
+    # only integers, not floats or booleans, within the range of an id
+    if type(value) is not int or not 0 <= value <= MAX_CURSOR_VALUE:
+        abort(400)
+    return value
+
+
+def paginate_questions_by_cursor(cursor, selection):
+    """Returns the formatted questions after `cursor` and the next cursor.
+
+    Keyset pagination on Question.id: the page is read with
+    `id > last_id ORDER BY id LIMIT n`, which costs the same at any depth
+    and does not skip or repeat rows when questions are added or deleted
+    between requests. The next cursor is None on the last page.
+    """
+    last_id = decode_cursor(cursor)
+    current_questions = selection.filter(Question.id > last_id).\
+        order_by(None).\
+        order_by(Question.id).\
+        limit(QUESTIONS_PER_PAGE + 1).\
+        all()
+
+    next_cursor = None
+    if len(current_questions) > QUESTIONS_PER_PAGE:
+        current_questions = current_questions[:QUESTIONS_PER_PAGE]
+        next_cursor = encode_cursor(current_questions[-1].id)
+
+    return [question.format() for question in current_questions], next_cursor
+
+
+def paginate(request, selection, cursor=None):
+    """Pages `selection` by cursor when one is given (even an empty one),
+    by page number otherwise.
+
+    Returns the formatted questions and the fields to add to the response.
+    """
+    if cursor is None:
+        return paginate_questions(request, selection), {}
+
+    questions, next_cursor = paginate_questions_by_cursor(cursor, selection)
+    return questions, {'next_cursor': next_cursor}
+
+
+def search_questions(request, question_search, term, cursor=None):
+    """Returns the formatted questions of a page of ranked search results,
+    the total number of matches and the fields to add to the response.
+
+    Ranked results have no stable key to seek on, so their cursor holds
+    the offset of the next page.
+    """
+    if cursor is None:
+        page = max(request.args.get('page', 1, type=int), 1)
+        start = (page - 1) * QUESTIONS_PER_PAGE
+    else:
+        start = decode_cursor(cursor, 'offset')
+
+    ids, total = question_search.search(term, start, QUESTIONS_PER_PAGE)
+    found = {question.id: question
+             for question in Question.query.filter(Question.id.in_(ids)).all()} if ids else {}
+    questions = [found[question_id].format() for question_id in ids if question_id in found]
+
+    if cursor is None:
+        return questions, total, {}
+    end = start + len(ids)
+    return questions, total, {'next_cursor': encode_cursor(end, 'offset') if end < total else None}
+
+
+def quiz_category_id(body):
+    """Returns the id of the quiz_category of a quiz request, 0 for "All".
+
+    The category object may carry its id, or only its type. Aborts with
+    400 for a category that does not exist.
+    """
+    category = body.get('quiz_category') or {}
+    category_id = category.get('id')
+    if category_id is None and category.get('type'):
+        category_id = category_registry.id_of(category['type'])
+        if category_id is None:
+            abort(400)
+    if not category_id:
+        return 0
+    if category_registry.type_of(category_id) is None:
+        abort(400)
+    return int(category_id)
 
 
 def create_app(test_config=None):
     # create and configure the app
     app = Flask(__name__)
-    setup_db(app)
+    app.config.from_mapping(
+        SQLALCHEMY_DATABASE_URI=database_path,
+        QUIZ_SESSION_BACKEND=os.environ.get('QUIZ_SESSION_BACKEND', 'memory'),
+        QUIZ_SESSION_DATABASE=os.environ.get('QUIZ_SESSION_DATABASE', 'quiz_sessions.db'),
+        SEARCH_ANSWERS=os.environ.get('SEARCH_ANSWERS', 'false').lower() == 'true',
+    )
+    if test_config is not None:
+        app.config.from_mapping(test_config)
+        if app.config.get('TESTING') and 'SQLALCHEMY_DATABASE_URI' not in test_config:
+            # tests get a private in-memory database, no server needed
+            app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    setup_db(app, app.config['SQLALCHEMY_DATABASE_URI'])
     CORS(app, resources={r"/api/*": {"origins": '*'}})
 
+    quiz_sessions = make_session_store(app.config)
+    question_search = make_question_search(app.config)
+    with app.app_context():
+        category_registry.load()
+
     @app.after_request
     def after_request(response):
         response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization,True')
@@ -32,31 +168,49 @@ def create_app(test_config=None):
 
     @app.route('/categories')
     def get_categories():
-        category_list = Category.query.with_entities(Category.type).all()
+        categories = category_registry.all()
 
-        if len(category_list) == 0:
+        if len(categories) == 0:
             abort(404)
 
         return jsonify({
-            'categories': category_list
+            'categories': categories
         })
 
     @app.route('/questions', methods=["GET"])
     def get_questions():
-        questions_list = Question.query.all()
-        questions = paginate_categories(request, questions_list)
-        categories = Category.query.all()
-        categories_list = [category.type for category in categories]
-
+        selection = Question.query.order_by(Question.id)
+        questions, page_info = paginate(request, selection, request.args.get('cursor'))
         if len(questions) == 0:
             abort(404)
 
         return jsonify({
             'status': 200,
             'questions': questions,
-            'total_questions': len(Question.query.all()),
-            'categories': categories_list
+            'total_questions': question_counts.total(),
+            'categories': category_registry.all(),
             # 'current_category': 'All'
+            **page_info
+        })
+
+    @app.route('/questions/search')
+    def get_search_results():
+        """Ranked search of the questions, `q` being the search term.
+
+        A GET so that HTTP caches can keep the results; the ids of the
+        first results of recent terms are also cached in the process.
+        """
+        term = request.args.get('q', '').strip()
+        if not term:
+            abort(400)
+        questions, total, page_info = search_questions(
+            request, question_search, term, request.args.get('cursor'))
+
+        return jsonify({
+            'success': True,
+            'questions': questions,
+            'total_questions': total,
+            **page_info
         })
 
     @app.route('/questions/<int:question_id>', methods=['DELETE'])
@@ -84,22 +238,33 @@ def create_app(test_config=None):
         new_difficulty = body.get('difficulty', None)
 
         search = body.get('searchTerm', None)
+        cursor = body.get('cursor', request.args.get('cursor'))
+        # validated here, an abort inside the try below would become a 405
+        if search and cursor:
+            decode_cursor(cursor, 'offset')
+        if not search and category_registry.type_of(new_category) is None:
+            abort(422)
 
         try:
             if search:
-                selection = Question.query.order_by(Question.id).filter(Question.question.ilike('%{}%'.format(search)))
-                search_questions = paginate_categories(request, selection)
+                questions, total, page_info = search_questions(request, question_search, search, cursor)
 
                 return jsonify({
                     'success': True,
-                    'questions': search_questions
+                    'questions': questions,
+                    'total_questions': total,
+                    **page_info
                 })
             else:
-                question = Question(question=new_question, answer=new_answer, category=new_category,
+                question = Question(question=new_question, answer=new_answer, category=int(new_category),
                                     difficulty=new_difficulty)
                 question.insert()
 
-                return redirect(url_for('get_questions'))
+                return jsonify({
+                    'success': True,
+                    'created': question.id,
+                    'question': question.format()
+                }), 201
         except:
             abort(405)
 
@@ -109,27 +274,98 @@ def create_app(test_config=None):
         if not id:
             return abort(400, 'Invalid category id')
 
-        selection = Question.query.filter(Question.category == id).all()
-        questions = paginate_categories(request, selection)
+        current_category = category_registry.type_of(id)
+        if current_category is None:
+            abort(404)
+
+        selection = Question.query.filter(Question.category == id).order_by(Question.id)
+        questions, page_info = paginate(request, selection, request.args.get('cursor'))
 
         return jsonify({
             'questions': questions,
-            'total_questions': len(questions),
-            'current_category': Category.query.with_entities(Category.type).filter(id == id).all()[0]
+            'total_questions': question_counts.for_category(id),
+            'current_category': current_category,
+            **page_info
         })
 
     @app.route('/quizzes', methods=['POST'])
     def play_quiz():
-        body = request.get_json()
-        previous_questions = body.get('previous_questions')
-        category = body.get('quiz_category')
-        category_id = int(category.get('id'))
-        questions = Question.query.filter(Question.category == category_id)
-        question = questions.order_by(func.random()).first()
+        body = request.get_json() or {}
+        previous_questions = body.get('previous_questions') or []
+        category_id = quiz_category_id(body)
+
+        question = None
+        while question is None:
+            question_id = question_index.sample(category_id, previous_questions)
+            if question_id is None:
+                # every question of the category has been asked
+                return jsonify({
+                    'success': True,
+                    'question': None,
+                    'quiz_over': True
+                })
+
+            question = Question.query.get(question_id)
+            if question is None:
+                # deleted by another process since the index was loaded
+                question_index.invalidate()
+
+        return jsonify({
+            'success': True,
+            'question': question.format(),
+            'quiz_over': False
+        })
+
+    @app.route('/quizzes/sessions', methods=['POST'])
+    def start_quiz_session():
+        """Starts a quiz: the category's question ids are shuffled once
+        into a deck that the session then deals from."""
+        body = request.get_json() or {}
+        category_id = quiz_category_id(body)
+
+        deck = question_index.ids(category_id)
+        random.shuffle(deck)
+        session_id = quiz_sessions.create(deck)
+
         return jsonify({
-            'question': question.format()
+            'success': True,
+            'session_id': session_id,
+            'total_questions': len(deck)
         })
 
+    @app.route('/quizzes/sessions/<session_id>/next', methods=['POST'])
+    def next_quiz_question(session_id):
+        question = None
+        while question is None:
+            try:
+                question_id = quiz_sessions.draw(session_id)
+            except SessionNotFound:
+                abort(404)
+
+            if question_id is None:
+                return jsonify({
+                    'success': True,
+                    'question': None,
+                    'quiz_over': True
+                })
+            # skips questions deleted since the deck was drawn
+            question = Question.query.get(question_id)
+
+        return jsonify({
+            'success': True,
+            'question': question.format(),
+            'remaining_questions': quiz_sessions.remaining(session_id),
+            'quiz_over': False
+        })
+
+    @app.errorhandler(400)
+    def bad_request(error):
+        return jsonify({
+            "success": False,
+            "error": 400,
+            "message": "bad request"
+        }), 400
+
     @app.errorhandler(404)
     def not_found(error):
         return jsonify({
@@ -0,0 +1,103 @@
+from sqlalchemy import func, literal_column, or_
+from sqlalchemy.engine.url import make_url
+
+from models import db, Question, question_text_index, search_cache
+
+# number of ranked ids cached per search term, deeper pages skip the cache
+SEARCH_CACHE_DEPTH = 200
+
+
+class InMemoryQuestionSearch:
+    """Question search over the in-process inverted index of models.py.
+
+    Used with SQLite and in the tests. The index is loaded on the first
+    search and kept in sync by Question.insert(), update() and delete().
+    """
+
+    def __init__(self, include_answers=False):
+        if question_text_index.include_answers != include_answers:
+            question_text_index.include_answers = include_answers
+            question_text_index.invalidate()
+
+    def search(self, term, offset, limit):
+        """Returns the ids of the ranked matches in [offset, offset + limit)
+        and the total number of matches."""
+        ids = question_text_index.search(term)
+        return ids[offset:offset + limit], len(ids)
+
+
+class PostgresQuestionSearch:
+    """Question search backed by Postgres indexes.
+
+    Terms are matched as English words through a GIN index on the
+    questions' tsvector, and as substrings through a pg_trgm GIN index,
+    which serves ILIKE '%term%' without a sequential scan. Both indexes
+    are created by the migrations. Results are ranked by ts_rank and
+    paginated in SQL.
+    """
+
+    def __init__(self, include_answers=False):
+        self.include_answers = include_answers
+
+    def _text(self):
+        if self.include_answers:
+            return "coalesce(question, '') || ' ' || coalesce(answer, '')"
+        return "coalesce(question, '')"
+
+    def search(self, term, offset, limit):
+        """Returns the ids of the ranked matches in [offset, offset + limit)
+        and the total number of matches."""
+        document = literal_column(self._text())
+        vector = func.to_tsvector('english', document)
+        query = func.plainto_tsquery('english', term)
+        matches = or_(vector.op('@@')(query),
+                      document.ilike('%{}%'.format(term)))
+
+        rows = db.session.query(Question.id, func.count().over()).\
+            filter(matches).\
+            order_by(func.ts_rank(vector, query).desc(), Question.id).\
+            offset(offset).\
+            limit(limit).\
+            all()
+
+        if rows:
+            return [row[0] for row in rows], rows[0][1]
+        # past the last page, the window count is not available
+        total = db.session.query(func.count(Question.id)).filter(matches).scalar()
+        return [], total
+
+
+class CachedQuestionSearch:
+    """Serves the first `depth` results of the recent search terms from
+    the search_cache of models.py, the rest from the search backend."""
+
+    def __init__(self, backend, depth=SEARCH_CACHE_DEPTH):
+        self.backend = backend
+        self.depth = depth
+
+    def search(self, term, offset, limit):
+        term = search_cache.normalize(term)
+        if offset + limit > self.depth:
+            return self.backend.search(term, offset, limit)
+
+        result = search_cache.get(term)
+        if result is None:
+            generation = search_cache.generation
+            result = self.backend.search(term, 0, self.depth)
+            search_cache.put(term, result, generation)
+        ids, total = result
+        return ids[offset:offset + limit], total
+
+
+def make_question_search(config):
+    """Builds the search backend matching the database engine."""
+    include_answers = config.get('SEARCH_ANSWERS', False)
+    backend = make_url(config['SQLALCHEMY_DATABASE_URI']).get_backend_name()
+    if backend in ('postgres', 'postgresql'):
+        question_search = PostgresQuestionSearch(include_answers)
+    else:
+        question_search = InMemoryQuestionSearch(include_answers)
+
+    search_cache.maxsize = config.get('SEARCH_CACHE_SIZE', search_cache.maxsize)
+    search_cache.invalidate()
+    return CachedQuestionSearch(question_search)
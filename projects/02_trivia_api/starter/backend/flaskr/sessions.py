@@ -0,0 +1,169 @@
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import closing
+
+SESSION_TTL = 3600
+MAX_SESSIONS = 10000
+
+
+class SessionNotFound(KeyError):
+    """The quiz session does not exist or has expired."""
+
+
+class MemorySessionStore:
+    """Quiz sessions kept in this process.
+
+    Each session holds its shuffled deck reversed, so drawing the next
+    question is a list pop. Sessions expire `ttl` seconds after their last
+    use and the least recently used ones are evicted beyond `maxsize`.
+    """
+
+    def __init__(self, ttl=SESSION_TTL, maxsize=MAX_SESSIONS, clock=time.monotonic):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.clock = clock
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _evict(self, now):
+        # sessions are ordered by last use, expired ones sit at the front
+        while self._sessions:
+            session_id, (expires_at, _) = next(iter(self._sessions.items()))
+            if expires_at > now and len(self._sessions) <= self.maxsize:
+                break
+            del self._sessions[session_id]
+
+    def create(self, deck):
+        session_id = secrets.token_urlsafe(16)
+        now = self.clock()
+        with self._lock:
+            self._sessions[session_id] = (now + self.ttl, list(reversed(deck)))
+            self._evict(now)
+        return session_id
+
+    def draw(self, session_id):
+        """Returns the next question id of the deck, None once it is empty."""
+        now = self.clock()
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None or session[0] <= now:
+                self._sessions.pop(session_id, None)
+                raise SessionNotFound(session_id)
+
+            deck = session[1]
+            self._sessions[session_id] = (now + self.ttl, deck)
+            self._sessions.move_to_end(session_id)
+            return deck.pop() if deck else None
+
+    def remaining(self, session_id):
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None or session[0] <= self.clock():
+                raise SessionNotFound(session_id)
+            return len(session[1])
+
+
+class SQLiteSessionStore:
+    """Quiz sessions kept in a SQLite file, shared by every worker process.
+
+    The deck is stored one card per row keyed by (session_id, position), so
+    drawing reads a single row by primary key whatever the deck size.
+    """
+
+    def __init__(self, path, ttl=SESSION_TTL, maxsize=MAX_SESSIONS, clock=time.time):
+        self.path = path
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.clock = clock
+        with closing(self._connect()) as connection, connection:
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS quiz_sessions ('
+                'id TEXT PRIMARY KEY, position INTEGER NOT NULL, '
+                'size INTEGER NOT NULL, expires_at REAL NOT NULL)')
+            connection.execute(
+                'CREATE INDEX IF NOT EXISTS ix_quiz_sessions_expires_at '
+                'ON quiz_sessions (expires_at)')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS quiz_session_cards ('
+                'session_id TEXT NOT NULL, position INTEGER NOT NULL, '
+                'question_id INTEGER NOT NULL, PRIMARY KEY (session_id, position))')
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=5, isolation_level=None)
+
+    @staticmethod
+    def _delete(connection, where, params):
+        connection.execute(
+            'DELETE FROM quiz_session_cards WHERE session_id IN '
+            '(SELECT id FROM quiz_sessions WHERE {})'.format(where), params)
+        connection.execute('DELETE FROM quiz_sessions WHERE {}'.format(where), params)
+
+    def create(self, deck):
+        session_id = secrets.token_urlsafe(16)
+        now = self.clock()
+        with closing(self._connect()) as connection:
+            connection.execute('BEGIN IMMEDIATE')
+            self._delete(connection, 'expires_at <= ?', (now,))
+            # beyond maxsize, drop the sessions closest to expiring
+            overflow = connection.execute('SELECT count(*) FROM quiz_sessions').fetchone()[0] \
+                - self.maxsize + 1
+            if overflow > 0:
+                self._delete(connection, 'id IN (SELECT id FROM quiz_sessions '
+                                         'ORDER BY expires_at LIMIT ?)', (overflow,))
+            connection.execute('INSERT INTO quiz_sessions VALUES (?, 0, ?, ?)',
+                               (session_id, len(deck), now + self.ttl))
+            connection.executemany('INSERT INTO quiz_session_cards VALUES (?, ?, ?)',
+                                   [(session_id, position, question_id)
+                                    for position, question_id in enumerate(deck)])
+            connection.execute('COMMIT')
+        return session_id
+
+    def draw(self, session_id):
+        """Returns the next question id of the deck, None once it is empty."""
+        now = self.clock()
+        with closing(self._connect()) as connection:
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                session = connection.execute(
+                    'SELECT position, size FROM quiz_sessions '
+                    'WHERE id = ? AND expires_at > ?', (session_id, now)).fetchone()
+                if session is None:
+                    raise SessionNotFound(session_id)
+
+                position, size = session
+                connection.execute(
+                    'UPDATE quiz_sessions SET position = ?, expires_at = ? WHERE id = ?',
+                    (min(position + 1, size), now + self.ttl, session_id))
+                card = connection.execute(
+                    'SELECT question_id FROM quiz_session_cards '
+                    'WHERE session_id = ? AND position = ?', (session_id, position)).fetchone()
+                connection.execute('COMMIT')
+            except BaseException:
+                connection.execute('ROLLBACK')
+                raise
+        return card[0] if card else None
+
+    def remaining(self, session_id):
+        with closing(self._connect()) as connection:
+            session = connection.execute(
+                'SELECT size - position FROM quiz_sessions WHERE id = ? AND expires_at > ?',
+                (session_id, self.clock())).fetchone()
+        if session is None:
+            raise SessionNotFound(session_id)
+        return session[0]
+
+
+def make_session_store(config):
+    """Builds the session store selected by QUIZ_SESSION_BACKEND."""
+    ttl = config.get('QUIZ_SESSION_TTL', SESSION_TTL)
+    maxsize = config.get('QUIZ_SESSION_MAX', MAX_SESSIONS)
+    backend = config.get('QUIZ_SESSION_BACKEND', 'memory')
+    if backend == 'memory':
+        return MemorySessionStore(ttl=ttl, maxsize=maxsize)
+    if backend == 'sqlite':
+        return SQLiteSessionStore(config['QUIZ_SESSION_DATABASE'], ttl=ttl, maxsize=maxsize)
+    raise ValueError('Unknown QUIZ_SESSION_BACKEND {!r}'.format(backend))
@@ -0,0 +1,42 @@
+"""trivia schema
+
+Revision ID: 5a1f0c3b2d41
+Revises: 
+Create Date: 2026-10-18 02:40:12.318904
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5a1f0c3b2d41'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # databases restored from trivia.psql, or created by db.create_all(),
+    # already have the tables
+    tables = sa.inspect(op.get_bind()).get_table_names()
+    if 'categories' not in tables:
+        op.create_table('categories',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('type', sa.String(), nullable=True),
+            sa.PrimaryKeyConstraint('id')
+        )
+    if 'questions' not in tables:
+        op.create_table('questions',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('question', sa.String(), nullable=True),
+            sa.Column('answer', sa.String(), nullable=True),
+            sa.Column('category', sa.String(), nullable=True),
+            sa.Column('difficulty', sa.Integer(), nullable=True),
+            sa.PrimaryKeyConstraint('id')
+        )
+
+
+def downgrade():
+    op.drop_table('questions')
+    op.drop_table('categories')
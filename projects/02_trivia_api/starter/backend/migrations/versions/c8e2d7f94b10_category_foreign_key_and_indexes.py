@@ -0,0 +1,49 @@
+"""category foreign key and indexes
+
+Revision ID: c8e2d7f94b10
+Revises: 5a1f0c3b2d41
+Create Date: 2026-10-18 02:44:57.902113
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c8e2d7f94b10'
+down_revision = '5a1f0c3b2d41'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    columns = {column['name']: column for column in inspector.get_columns('questions')}
+    # trivia.psql already declares an integer category with a foreign key
+    is_integer = isinstance(columns['category']['type'], sa.Integer)
+    has_foreign_key = any(foreign_key['constrained_columns'] == ['category']
+                          for foreign_key in inspector.get_foreign_keys('questions'))
+    indexes = {index['name'] for index in inspector.get_indexes('questions')}
+
+    with op.batch_alter_table('questions', schema=None) as batch_op:
+        if not is_integer:
+            batch_op.alter_column('category',
+                                  existing_type=sa.String(),
+                                  type_=sa.Integer(),
+                                  postgresql_using='category::integer')
+        if not has_foreign_key:
+            batch_op.create_foreign_key('questions_category_fkey', 'categories',
+                                        ['category'], ['id'],
+                                        onupdate='CASCADE', ondelete='SET NULL')
+        if 'ix_questions_category_id' not in indexes:
+            batch_op.create_index('ix_questions_category_id', ['category', 'id'], unique=False)
+        if 'ix_questions_difficulty' not in indexes:
+            batch_op.create_index('ix_questions_difficulty', ['difficulty'], unique=False)
+
+
+def downgrade():
+    # the column type and the foreign key are left as they are, a database
+    # restored from trivia.psql had them before this revision
+    with op.batch_alter_table('questions', schema=None) as batch_op:
+        batch_op.drop_index('ix_questions_difficulty')
+        batch_op.drop_index('ix_questions_category_id')
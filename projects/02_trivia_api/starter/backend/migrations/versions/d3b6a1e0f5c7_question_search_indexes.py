@@ -0,0 +1,48 @@
+"""question search indexes
+
+Revision ID: d3b6a1e0f5c7
+Revises: c8e2d7f94b10
+Create Date: 2026-10-18 07:12:44.318265
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from flask import current_app
+
+
+# revision identifiers, used by Alembic.
+revision = 'd3b6a1e0f5c7'
+down_revision = 'c8e2d7f94b10'
+branch_labels = None
+depends_on = None
+
+
+def document():
+    # must match the text PostgresQuestionSearch searches in flaskr/search.py
+    if current_app.config.get('SEARCH_ANSWERS', False):
+        return "coalesce(question, '') || ' ' || coalesce(answer, '')"
+    return "coalesce(question, '')"
+
+
+def upgrade():
+    # Postgres only, SQLite searches the in-process index of models.py.
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    # built concurrently, i.e. outside of a transaction, so that writes to
+    # the questions are not blocked while the indexes are built
+    with op.get_context().autocommit_block():
+        op.execute("CREATE INDEX CONCURRENTLY IF NOT EXISTS questions_search_tsv_idx "
+                   "ON questions USING gin (to_tsvector('english', {}))".format(document()))
+        op.execute("CREATE INDEX CONCURRENTLY IF NOT EXISTS questions_search_trgm_idx "
+                   "ON questions USING gin (({}) gin_trgm_ops)".format(document()))
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    with op.get_context().autocommit_block():
+        op.execute('DROP INDEX CONCURRENTLY IF EXISTS questions_search_trgm_idx')
+        op.execute('DROP INDEX CONCURRENTLY IF EXISTS questions_search_tsv_idx')
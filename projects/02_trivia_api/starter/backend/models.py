@@ -1,24 +1,434 @@
+import bisect
 import os
-from sqlalchemy import Column, String, Integer, create_engine
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+from sqlalchemy import Column, String, Integer, ForeignKey, Index, create_engine, func
 from flask_sqlalchemy import SQLAlchemy
+from flask_migrate import Migrate
 import json
 
 database_name = "trivia"
 database_path = "postgres://{}/{}".format('localhost:5432', database_name)
 
 db = SQLAlchemy()
+migrate = Migrate()
+
+MIGRATIONS_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
 
 '''
 setup_db(app)
     binds a flask application and a SQLAlchemy service
+    the schema of an existing database is upgraded with `flask db upgrade`
+    (migrations/), create_all() only creates the missing tables
 '''
 def setup_db(app, database_path=database_path):
     app.config["SQLALCHEMY_DATABASE_URI"] = database_path
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
     db.app = app
     db.init_app(app)
+    # batch mode lets the migrations alter columns on SQLite too
+    migrate.init_app(app, db, directory=MIGRATIONS_DIRECTORY, render_as_batch=True)
     db.create_all()
 
+'''
+QuestionCounts
+    cached COUNT(*) of the questions, globally and per category
+    loaded with two aggregate queries, then kept up to date incrementally
+    by Question.insert() / Question.delete(); reloaded after `ttl` seconds
+    to pick up writes made by other processes
+'''
+class QuestionCounts:
+  def __init__(self, ttl=60, clock=time.monotonic):
+    self.ttl = ttl
+    self.clock = clock
+    self._total = None
+    self._by_category = None
+    self._loaded_at = None
+    self._lock = threading.Lock()
+
+  def _ensure_loaded(self):
+    if self._loaded_at is not None and self.clock() - self._loaded_at < self.ttl:
+      return
+    total = db.session.query(func.count(Question.id)).scalar()
+    by_category = dict(
+      db.session.query(Question.category, func.count(Question.id)).
+      group_by(Question.category).all())
+    with self._lock:
+      self._total = total
+      self._by_category = {str(category): count for category, count in by_category.items()}
+      self._loaded_at = self.clock()
+
+  def total(self):
+    self._ensure_loaded()
+    return self._total
+
+  def for_category(self, category):
+    self._ensure_loaded()
+    return self._by_category.get(str(category), 0)
+
+  def added(self, category):
+    with self._lock:
+      if self._loaded_at is not None:
+        self._total += 1
+        key = str(category)
+        self._by_category[key] = self._by_category.get(key, 0) + 1
+
+  def removed(self, category):
+    with self._lock:
+      if self._loaded_at is not None:
+        self._total -= 1
+        key = str(category)
+        self._by_category[key] = max(self._by_category.get(key, 0) - 1, 0)
+
+  def invalidate(self):
+    with self._lock:
+      self._loaded_at = None
+
+
+question_counts = QuestionCounts()
+
+'''
+QuestionIndex
+    in-memory index of the question ids of every category, used by the
+    quiz to draw a question without scanning the table
+    loaded with one query of (id, category), then kept up to date by
+    Question.insert() / Question.delete(); reloaded after `ttl` seconds
+    to pick up writes made by other processes
+    category 0 stands for all the categories
+'''
+class QuestionIndex:
+  ALL = '0'
+
+  def __init__(self, ttl=60, clock=time.monotonic):
+    self.ttl = ttl
+    self.clock = clock
+    self._ids = None
+    self._positions = None
+    self._loaded_at = None
+    self._lock = threading.Lock()
+
+  def _ensure_loaded(self):
+    if self._loaded_at is not None and self.clock() - self._loaded_at < self.ttl:
+      return
+    rows = db.session.query(Question.id, Question.category).all()
+    with self._lock:
+      self._ids = {}
+      self._positions = {}
+      for question_id, category in rows:
+        self._add(question_id, category)
+      self._loaded_at = self.clock()
+
+  def _add(self, question_id, category):
+    for key in (self.ALL, str(category)):
+      ids = self._ids.setdefault(key, [])
+      positions = self._positions.setdefault(key, {})
+      if question_id not in positions:
+        positions[question_id] = len(ids)
+        ids.append(question_id)
+
+  def _remove(self, question_id, category):
+    for key in (self.ALL, str(category)):
+      ids = self._ids.get(key, [])
+      positions = self._positions.get(key, {})
+      position = positions.pop(question_id, None)
+      if position is None:
+        continue
+      # swap with the last id so removal stays O(1)
+      last = ids.pop()
+      if last != question_id:
+        ids[position] = last
+        positions[last] = position
+
+  def sample(self, category, exclude=()):
+    '''
+    returns a question id of `category` drawn uniformly among the ids
+    not in `exclude`, or None when every question has been excluded
+    '''
+    self._ensure_loaded()
+    with self._lock:
+      key = str(category)
+      ids = self._ids.get(key, [])
+      positions = self._positions.get(key, {})
+      exclude = set(exclude)
+      seen = sum(1 for question_id in exclude if question_id in positions)
+      remaining = len(ids) - seen
+      if remaining <= 0:
+        return None
+      # rejection sampling while most ids are still available,
+      # an explicit set difference once the quiz has used most of them
+      if remaining * 2 >= len(ids):
+        while True:
+          question_id = random.choice(ids)
+          if question_id not in exclude:
+            return question_id
+      return random.choice([question_id for question_id in ids if question_id not in exclude])
+
+  def ids(self, category):
+    '''
+    returns a copy of the question ids of `category`
+    '''
+    self._ensure_loaded()
+    with self._lock:
+      return list(self._ids.get(str(category), []))
+
+  def added(self, question_id, category):
+    with self._lock:
+      if self._loaded_at is not None:
+        self._add(question_id, category)
+
+  def removed(self, question_id, category):
+    with self._lock:
+      if self._loaded_at is not None:
+        self._remove(question_id, category)
+
+  def invalidate(self):
+    with self._lock:
+      self._loaded_at = None
+
+
+question_index = QuestionIndex()
+
+
+'''
+QuestionTextIndex
+    in-process inverted index of the question text (and optionally the
+    answers), the search backend used on SQLite and in tests
+    a term matches the words it is a prefix of, every term of a search
+    must match; results are ranked by exact word matches, then by id
+    loaded on first use, then kept in sync by Question.insert(),
+    update() and delete(); reloaded after `ttl` seconds to pick up
+    writes made by other processes
+'''
+class QuestionTextIndex:
+  WORD = re.compile(r'\w+')
+
+  def __init__(self, include_answers=False, ttl=60, clock=time.monotonic):
+    self.include_answers = include_answers
+    self.ttl = ttl
+    self.clock = clock
+    self._postings = None
+    self._vocabulary = None
+    self._words_by_id = None
+    self._loaded_at = None
+    self._lock = threading.Lock()
+
+  @classmethod
+  def tokenize(cls, text):
+    return cls.WORD.findall((text or '').lower())
+
+  def _ensure_loaded(self):
+    if self._loaded_at is not None and self.clock() - self._loaded_at < self.ttl:
+      return
+    columns = [Question.id, Question.question]
+    if self.include_answers:
+      columns.append(Question.answer)
+    rows = db.session.query(*columns).all()
+    with self._lock:
+      # the vocabulary is sorted once at the end, not kept sorted per word
+      self._vocabulary = None
+      self._postings = {}
+      self._words_by_id = {}
+      for row in rows:
+        self._add(row[0], *row[1:])
+      self._vocabulary = sorted(self._postings)
+      self._loaded_at = self.clock()
+
+  def _add(self, question_id, *texts):
+    words = frozenset(word for text in texts for word in self.tokenize(text))
+    self._words_by_id[question_id] = words
+    for word in words:
+      postings = self._postings.get(word)
+      if postings is None:
+        postings = self._postings[word] = set()
+        if self._vocabulary is not None:
+          bisect.insort(self._vocabulary, word)
+      postings.add(question_id)
+
+  def _remove(self, question_id):
+    for word in self._words_by_id.pop(question_id, ()):
+      postings = self._postings[word]
+      postings.discard(question_id)
+      if not postings:
+        del self._postings[word]
+        del self._vocabulary[bisect.bisect_left(self._vocabulary, word)]
+
+  def _matching(self, term):
+    # ids of every word starting with `term`, found by bisecting the vocabulary
+    ids = set()
+    position = bisect.bisect_left(self._vocabulary, term)
+    while position < len(self._vocabulary) and self._vocabulary[position].startswith(term):
+      ids |= self._postings[self._vocabulary[position]]
+      position += 1
+    return ids
+
+  def search(self, text):
+    '''
+    returns the ids of the questions matching every term of `text`,
+    best ranked first
+    '''
+    terms = self.tokenize(text)
+    if not terms:
+      return []
+    self._ensure_loaded()
+    with self._lock:
+      matches = None
+      for term in sorted(set(terms), key=len, reverse=True):
+        ids = self._matching(term)
+        matches = ids if matches is None else matches & ids
+        if not matches:
+          return []
+      # rank by the number of terms matching a whole word, then by id
+      scores = {}
+      for term in set(terms):
+        for question_id in self._postings.get(term, set()) & matches:
+          scores[question_id] = scores.get(question_id, 0) + 1
+      ranks = [set() for _ in range(len(terms) + 1)]
+      ranks[0] = matches.difference(scores)
+      for question_id, score in scores.items():
+        ranks[score].add(question_id)
+      return [question_id for rank in reversed(ranks) for question_id in sorted(rank)]
+
+  def _texts(self, question):
+    if self.include_answers:
+      return question.question, question.answer
+    return (question.question,)
+
+  def added(self, question):
+    with self._lock:
+      if self._postings is not None:
+        self._add(question.id, *self._texts(question))
+
+  def updated(self, question):
+    with self._lock:
+      if self._postings is not None:
+        self._remove(question.id)
+        self._add(question.id, *self._texts(question))
+
+  def removed(self, question_id):
+    with self._lock:
+      if self._postings is not None:
+        self._remove(question_id)
+
+  def invalidate(self):
+    with self._lock:
+      self._postings = None
+      self._vocabulary = None
+      self._words_by_id = None
+      self._loaded_at = None
+
+
+question_text_index = QuestionTextIndex()
+
+
+'''
+SearchResultCache
+    LRU cache of the results (first ranked question ids and total) of the
+    most recent searches, keyed by the normalized search term
+    emptied by Question.insert(), update() and delete(); entries expire
+    after `ttl` seconds to pick up writes made by other processes
+'''
+class SearchResultCache:
+  def __init__(self, maxsize=1024, ttl=60, clock=time.monotonic):
+    self.maxsize = maxsize
+    self.ttl = ttl
+    self.clock = clock
+    # bumped on every write, a search started before it is not cached
+    self.generation = 0
+    self._entries = OrderedDict()
+    self._lock = threading.Lock()
+
+  @staticmethod
+  def normalize(term):
+    return ' '.join((term or '').lower().split())
+
+  def get(self, term):
+    with self._lock:
+      entry = self._entries.get(term)
+      if entry is None:
+        return None
+      if self.clock() - entry[0] >= self.ttl:
+        del self._entries[term]
+        return None
+      self._entries.move_to_end(term)
+      return entry[1]
+
+  def put(self, term, result, generation):
+    with self._lock:
+      if generation != self.generation:
+        return
+      self._entries[term] = (self.clock(), result)
+      self._entries.move_to_end(term)
+      while len(self._entries) > self.maxsize:
+        self._entries.popitem(last=False)
+
+  def invalidate(self):
+    with self._lock:
+      self.generation += 1
+      self._entries.clear()
+
+
+search_cache = SearchResultCache()
+
+
+'''
+CategoryRegistry
+    the categories, loaded once and kept in memory since they hardly
+    ever change; maps a category id to its type and a type to its id
+    reloaded on the next lookup after Category.insert(), update() or
+    delete(), or while no category was found
+'''
+class CategoryRegistry:
+  def __init__(self):
+    # (types by id, ids by type), replaced as a whole so that readers
+    # never see half a reload
+    self._lookups = None
+
+  def load(self):
+    rows = db.session.query(Category.id, Category.type).order_by(Category.id).all()
+    lookups = (
+      {category_id: type for category_id, type in rows},
+      {type: category_id for category_id, type in rows})
+    self._lookups = lookups
+    return lookups
+
+  def _ensure_loaded(self):
+    lookups = self._lookups
+    # an empty table is looked at again, it may not have been seeded yet
+    if lookups is None or not lookups[0]:
+      lookups = self.load()
+    return lookups
+
+  def all(self):
+    '''
+    returns the category types by id, as a new dictionary
+    '''
+    types, _ = self._ensure_loaded()
+    return {str(category_id): type for category_id, type in types.items()}
+
+  def type_of(self, category_id):
+    '''
+    returns the type of a category id (an int or a numeric string),
+    None for an unknown category
+    '''
+    types, _ = self._ensure_loaded()
+    try:
+      return types.get(int(category_id))
+    except (TypeError, ValueError):
+      return None
+
+  def id_of(self, type):
+    _, ids = self._ensure_loaded()
+    return ids.get(type)
+
+  def invalidate(self):
+    self._lookups = None
+
+
+category_registry = CategoryRegistry()
+
 '''
 Question
 
@@ -29,9 +439,15 @@ class Question(db.Model):
   id = Column(Integer, primary_key=True)
   question = Column(String)
   answer = Column(String)
-  category = Column(String)
+  category = Column(Integer, ForeignKey('categories.id', onupdate='CASCADE', ondelete='SET NULL'))
   difficulty = Column(Integer)
 
+  __table_args__ = (
+    # listing a category by page or by cursor, counting per category
+    Index('ix_questions_category_id', 'category', 'id'),
+    Index('ix_questions_difficulty', 'difficulty'),
+  )
+
   def __init__(self, question, answer, category, difficulty):
     self.question = question
     self.answer = answer
@@ -41,13 +457,27 @@ class Question(db.Model):
   def insert(self):
     db.session.add(self)
     db.session.commit()
-  
+    question_counts.added(self.category)
+    question_index.added(self.id, self.category)
+    question_text_index.added(self)
+    search_cache.invalidate()
+
   def update(self):
     db.session.commit()
+    # the category may have changed
+    question_counts.invalidate()
+    question_index.invalidate()
+    question_text_index.updated(self)
+    search_cache.invalidate()
 
   def delete(self):
+    question_id, category = self.id, self.category
     db.session.delete(self)
     db.session.commit()
+    question_counts.removed(category)
+    question_index.removed(question_id, category)
+    question_text_index.removed(question_id)
+    search_cache.invalidate()
 
   def format(self):
     return {
@@ -71,6 +501,23 @@ class Category(db.Model):
   def __init__(self, type):
     self.type = type
 
+  def insert(self):
+    db.session.add(self)
+    db.session.commit()
+    category_registry.invalidate()
+
+  def update(self):
+    db.session.commit()
+    category_registry.invalidate()
+
+  def delete(self):
+    db.session.delete(self)
+    db.session.commit()
+    category_registry.invalidate()
+    # its questions were moved to no category
+    question_counts.invalidate()
+    question_index.invalidate()
+
   def format(self):
     return {
       'id': self.id,
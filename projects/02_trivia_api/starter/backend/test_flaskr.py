@@ -1,22 +1,58 @@
+import base64
 import os
+import re
+import time
 import unittest
 from flask import json
-from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
 
-from flaskr import create_app
-from models import setup_db, Question, Category
+from flaskr import create_app, encode_cursor
+from models import (db, Question, Category, category_registry, question_counts,
+                    question_index, question_text_index, search_cache)
+
+TRIVIA_DUMP = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'trivia.psql')
+
+app = None
+
+
+def read_fixtures(path=TRIVIA_DUMP):
+    """Returns the rows of the COPY blocks of a pg_dump file, by table."""
+    tables = {}
+    rows = None
+    with open(path) as dump:
+        for line in dump:
+            line = line.rstrip('\n')
+            copy = re.match(r'COPY public\.(\w+) \((.*)\) FROM stdin;$', line)
+            if copy:
+                columns = copy.group(2).split(', ')
+                rows = tables.setdefault(copy.group(1), [])
+            elif line == '\\.':
+                rows = None
+            elif rows is not None:
+                values = [None if value == '\\N' else value for value in line.split('\t')]
+                rows.append(dict(zip(columns, values)))
+    return tables
+
+
+def setUpModule():
+    """Creates the app, its in-memory database and the trivia.psql data
+    once for the whole test run."""
+    global app
+    app = create_app({'TESTING': True})
+    fixtures = read_fixtures()
+    with app.app_context():
+        db.session.execute(Category.__table__.insert(), fixtures['categories'])
+        db.session.execute(Question.__table__.insert(), fixtures['questions'])
+        db.session.commit()
 
 
 class TriviaTestCase(unittest.TestCase):
     """This class represents the trivia test case"""
 
     def setUp(self):
-        """Define test variables and initialize app."""
-        self.app = create_app()
+        """Define test variables and start the test's transaction."""
+        self.app = app
         self.client = self.app.test_client
-        self.database_name = "trivia_test"
-        self.database_path = "postgres://{}/{}".format('localhost:5432', self.database_name)
-        setup_db(self.app, self.database_path)
 
         self.new_question = {
             'question': 'Which is the capital city of UK',
@@ -25,16 +61,26 @@ class TriviaTestCase(unittest.TestCase):
             'difficulty': 6
         }
 
-        # binds the app to the current context
-        with self.app.app_context():
-            self.db = SQLAlchemy()
-            self.db.init_app(self.app)
-            # create all tables
-            self.db.create_all()
-    
+        # every session of the test is bound to this connection, the commits
+        # of the app then only end nested transactions and tearDown rolls
+        # all of them back
+        self.context = self.app.app_context()
+        self.context.push()
+        self.connection = db.engine.connect()
+        self.transaction = self.connection.begin()
+        self.session = db.session
+        db.session = db.create_scoped_session(options={'bind': self.connection, 'binds': {}})
+
     def tearDown(self):
-        """Executed after reach test"""
-        pass
+        """Roll the test's writes back and forget what the caches saw."""
+        db.session.remove()
+        db.session = self.session
+        self.transaction.rollback()
+        self.connection.close()
+        self.context.pop()
+        for cache in (category_registry, question_counts, question_index,
+                      question_text_index, search_cache):
+            cache.invalidate()
 
     def test_get_categories(self):
         categories = "/categories"
@@ -63,19 +109,47 @@ class TriviaTestCase(unittest.TestCase):
             # self.assertEqual(data['total_questions'], 25)
             self.assertTrue(data['categories'])
 
+    def test_get_questions_by_cursor(self):
+        res = self.client().get('/questions?cursor=')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(data['questions'])
+        self.assertIn('next_cursor', data)
+
+        if data['next_cursor']:
+            next_res = self.client().get(f"/questions?cursor={data['next_cursor']}")
+            next_data = json.loads(next_res.data)
+            self.assertEqual(next_res.status_code, 200)
+            self.assertGreater(next_data['questions'][0]['id'], data['questions'][-1]['id'])
+
+    def test_400_invalid_cursor(self):
+        res = self.client().get('/questions?cursor=not-a-cursor')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(data['success'], False)
+
+        for url in ('/questions?cursor={}'.format(encode_cursor(value))
+                    for value in (10 ** 30, float('inf'), 1.5, True, -1, '1')):
+            self.assertEqual(self.client().get(url).status_code, 400, url)
+
+        raw = base64.urlsafe_b64encode(b'{"id": 1e400}').decode()
+        self.assertEqual(self.client().get('/questions?cursor=' + raw).status_code, 400)
+
+        res = self.client().get('/questions/search?q=title&cursor={}'.format(
+            encode_cursor(float('inf'), 'offset')))
+        self.assertEqual(res.status_code, 400)
+
     def test_delete_question(self):
-        question_id = 30
+        question_id = 5
         res = self.client().delete(f'/questions/{question_id}')
         data = json.loads(res.data)
 
-        if res.status_code == 405:
-            self.assertEqual(res.status_code, 405)
-            self.assertEqual(data['success'], False)
-            self.assertEqual(data['message'], "method not allowed")
-        else:
-            question = Question.query.filter(Question.id == question_id).one_or_none()
-            self.assertEqual(res.status_code, 200)
-            self.assertEqual(question, None)
+        question = Question.query.filter(Question.id == question_id).one_or_none()
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['success'], True)
+        self.assertEqual(question, None)
 
     def test_404_delete_question_fail(self):
         question_id = 1
@@ -94,12 +168,55 @@ class TriviaTestCase(unittest.TestCase):
 
         self.assertEqual(res.status_code, 200)
 
-    def test_create_question(self):
-        self.client().post('/questions', data=json.dumps(self.new_question), content_type='application/json')
+    def test_search_by_cursor(self):
+        request_data = {'searchTerm': 'title', 'cursor': ''}
+        res = self.client().post('/questions', data=json.dumps(request_data),
+                                 content_type='application/json')
+        data = json.loads(res.data)
 
-        res = self.client().get('/questions')
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(data['questions'])
+        self.assertEqual(data['total_questions'], len(data['questions']))
+        self.assertIsNone(data['next_cursor'])
+
+    def test_search_endpoint(self):
+        res = self.client().get('/questions/search?q=title')
+        data = json.loads(res.data)
 
         self.assertEqual(res.status_code, 200)
+        self.assertTrue(data['questions'])
+        self.assertEqual(data['total_questions'], len(data['questions']))
+
+    def test_400_search_without_term(self):
+        res = self.client().get('/questions/search')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(data['success'], False)
+
+    def test_search_index_reloads_after_ttl(self):
+        now = [0]
+        question_text_index.clock = lambda: now[0]
+        try:
+            self.assertEqual(question_text_index.search('zanzibar'), [])
+            # written by another process, i.e. without going through Question.insert()
+            db.session.execute(Question.__table__.insert(), {
+                'question': 'What is the capital of Zanzibar', 'answer': 'Zanzibar City',
+                'category': 3, 'difficulty': 2})
+            self.assertEqual(question_text_index.search('zanzibar'), [])
+
+            now[0] += question_text_index.ttl
+            self.assertEqual(len(question_text_index.search('zanzibar')), 1)
+        finally:
+            question_text_index.clock = time.monotonic
+
+    def test_create_question(self):
+        res = self.client().post('/questions', data=json.dumps(self.new_question), content_type='application/json')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 201)
+        self.assertEqual(data['question']['id'], data['created'])
+        self.assertEqual(data['question']['question'], self.new_question['question'])
 
     def test_get_questions_by_category(self):
         res = self.client().get('/categories/1/questions')
@@ -107,7 +224,14 @@ class TriviaTestCase(unittest.TestCase):
 
         self.assertEqual(res.status_code, 200)
         self.assertTrue(data['questions'])
-        self.assertTrue(data['current_category'])
+        self.assertEqual(data['current_category'], 'Science')
+
+    def test_404_get_questions_by_unknown_category(self):
+        res = self.client().get('/categories/1000/questions')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 404)
+        self.assertEqual(data['success'], False)
 
     # def test_get_questions_by_category_fail(self):
     #     category_id = 0
@@ -117,6 +241,104 @@ class TriviaTestCase(unittest.TestCase):
     #     self.assertEqual(res.status_code, 400)
     #     self.assertEqual(data['success'], False)
 
+    def test_play_quiz(self):
+        res = self.client().post('/quizzes', data=json.dumps({
+            'previous_questions': [],
+            'quiz_category': {'type': 'All', 'id': 0}
+        }), content_type='application/json')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(data['question'])
+        self.assertEqual(data['quiz_over'], False)
+
+    def test_play_quiz_skips_previous_questions(self):
+        previous_questions = []
+        while True:
+            res = self.client().post('/quizzes', data=json.dumps({
+                'previous_questions': previous_questions,
+                'quiz_category': {'type': 'Science', 'id': 1}
+            }), content_type='application/json')
+            data = json.loads(res.data)
+            self.assertEqual(res.status_code, 200)
+
+            if data['quiz_over']:
+                break
+            self.assertNotIn(data['question']['id'], previous_questions)
+            previous_questions.append(data['question']['id'])
+
+        self.assertEqual(data['question'], None)
+
+    def test_quiz_session(self):
+        res = self.client().post('/quizzes/sessions', data=json.dumps({
+            'quiz_category': {'type': 'Science', 'id': 1}
+        }), content_type='application/json')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(data['session_id'])
+
+        asked = []
+        for _ in range(data['total_questions']):
+            res = self.client().post(f"/quizzes/sessions/{data['session_id']}/next")
+            question = json.loads(res.data)['question']
+            self.assertEqual(res.status_code, 200)
+            self.assertNotIn(question['id'], asked)
+            asked.append(question['id'])
+
+        res = self.client().post(f"/quizzes/sessions/{data['session_id']}/next")
+        self.assertEqual(json.loads(res.data)['quiz_over'], True)
+
+    def test_404_unknown_quiz_session(self):
+        res = self.client().post('/quizzes/sessions/unknown/next')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 404)
+        self.assertEqual(data['success'], False)
+
+    def route_queries(self, method, url, **kwargs):
+        """Returns the SELECTs on the questions table run by a request, with
+        their parameters. The request is sent twice so that the in-memory
+        caches are loaded and only the per-request queries are recorded."""
+        self.client().open(url, method=method, **kwargs)
+
+        queries = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            if statement.lstrip().upper().startswith('SELECT') and 'questions' in statement:
+                queries.append((statement, parameters))
+
+        engine = db.engine
+        event.listen(engine, 'before_cursor_execute', record)
+        try:
+            self.client().open(url, method=method, **kwargs)
+        finally:
+            event.remove(engine, 'before_cursor_execute', record)
+        return queries
+
+    def sequential_scans(self, statement, parameters):
+        """Returns the plan and its steps reading the questions table
+        sequentially."""
+        plan = [row[-1] for row in self.connection.execute('EXPLAIN QUERY PLAN ' + statement, parameters)]
+        scans = [step for step in plan
+                 if re.match(r'SCAN (TABLE )?questions\b', step) and 'INDEX' not in step]
+        return plan, scans
+
+    def test_hot_routes_use_indexes(self):
+        routes = [
+            ('GET', '/categories/1/questions', {}),
+            ('GET', '/categories/1/questions?page=2', {}),
+            ('GET', '/categories/1/questions?cursor=', {}),
+            ('GET', '/questions?cursor=eyJpZCI6IDV9', {}),
+            ('POST', '/quizzes', {'json': {'previous_questions': [], 'quiz_category': {'id': 1}}}),
+        ]
+        for method, url, kwargs in routes:
+            queries = self.route_queries(method, url, **kwargs)
+            self.assertTrue(queries, url)
+            for statement, parameters in queries:
+                plan, scans = self.sequential_scans(statement, parameters)
+                self.assertFalse(scans, '{} {}\n{}\n{}'.format(method, url, statement, '\n'.join(plan)))
+
     def test_405_metho_not_allowed(self):
         res = self.client().delete('/questions/1000')
         data = json.loads(res.data)
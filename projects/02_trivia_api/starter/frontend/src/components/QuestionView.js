@@ -78,11 +78,10 @@ class QuestionView extends Component {
 
   submitSearch = (searchTerm) => {
     $.ajax({
-      url: `/questions`, //TODO: update request URL
-      type: "POST",
+      url: `/questions/search`, //TODO: update request URL
+      type: "GET",
       dataType: 'json',
-      contentType: 'application/json',
-      data: JSON.stringify({searchTerm: searchTerm}),
+      data: {q: searchTerm},
       xhrFields: {
         withCredentials: true
       },
@@ -0,0 +1,60 @@
+'''
+Cold-start benchmark for the coffee shop backend.
+
+Measures, in fresh interpreter processes, the time from importing the
+application to its first response (GET /drinks) against an existing
+database, i.e. what every new worker process pays before serving.
+
+    python bench_cold_start.py [runs]
+'''
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+CHILD = '''
+import json, sys, time
+started = time.perf_counter()
+from src.api import create_app
+imported = time.perf_counter()
+app = create_app()
+created = time.perf_counter()
+response = app.test_client().get('/drinks')
+responded = time.perf_counter()
+print(json.dumps({
+    'import': imported - started,
+    'create_app': created - imported,
+    'first_response': responded - created,
+    'total': responded - started,
+    'status': response.status_code
+}))
+'''
+
+
+def main(runs=10):
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, JWKS_BACKGROUND_REFRESH='false',
+                   DATABASE_URL='sqlite:///' + os.path.join(tmp, 'bench.db'))
+        subprocess.run([sys.executable, '-m', 'flask', 'create-db'], cwd=BACKEND_DIR,
+                       env=dict(env, FLASK_APP='src.api'), check=True,
+                       stdout=subprocess.DEVNULL)
+
+        samples = []
+        for _ in range(runs):
+            output = subprocess.run([sys.executable, '-c', CHILD],
+                                    cwd=BACKEND_DIR, env=env, check=True,
+                                    capture_output=True, text=True).stdout
+            samples.append(json.loads(output.strip().splitlines()[-1]))
+
+    for phase in ('import', 'create_app', 'first_response', 'total'):
+        timings = [sample[phase] * 1000 for sample in samples]
+        print('%-16s median %7.1f ms   max %7.1f ms' % (
+            phase, statistics.median(timings), max(timings)))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:2]])
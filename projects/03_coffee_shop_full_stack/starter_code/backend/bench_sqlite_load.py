@@ -0,0 +1,93 @@
+'''
+Concurrent read/write load test for the coffee shop SQLite database.
+
+Runs reader threads (the drinks menu query) and writer threads (drink
+updates, one commit each) against a fresh database file, first with the
+default SQLite settings and then with the production profile from
+src/database/models.py, and reports the throughput of both.
+
+    python bench_sqlite_load.py [seconds] [readers] [writers]
+'''
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from flask import Flask
+from sqlalchemy.exc import OperationalError
+
+from src.database.models import db, setup_db, Drink
+
+SEED_DRINKS = 200
+
+
+def build_app(database_uri, sqlite_tuning):
+    app = Flask(__name__)
+    setup_db(app, database_uri, sqlite_tuning=sqlite_tuning)
+    with app.app_context():
+        db.create_all()
+        recipe = json.dumps([{'color': 'brown', 'name': 'coffee', 'parts': 1}])
+        db.session.add_all([Drink(title='drink %d' % i, recipe=recipe)
+                            for i in range(SEED_DRINKS)])
+        db.session.commit()
+    return app
+
+
+def reader(app, stop, counts):
+    with app.app_context():
+        while not stop.is_set():
+            try:
+                [drink.long() for drink in Drink.query.all()]
+                counts['reads'] += 1
+            except OperationalError:
+                counts['errors'] += 1
+            finally:
+                db.session.remove()
+
+
+def writer(app, stop, counts, offset):
+    with app.app_context():
+        n = offset
+        while not stop.is_set():
+            n += 1
+            try:
+                drink = Drink.query.get(n % SEED_DRINKS + 1)
+                drink.recipe = json.dumps([{'color': 'white', 'name': 'milk', 'parts': n % 5 + 1}])
+                drink.update()
+                counts['writes'] += 1
+            except OperationalError:
+                counts['errors'] += 1
+            finally:
+                db.session.remove()
+
+
+def run(app, seconds, readers, writers):
+    stop = threading.Event()
+    counts = {'reads': 0, 'writes': 0, 'errors': 0}
+    threads = [threading.Thread(target=reader, args=(app, stop, counts))
+               for _ in range(readers)]
+    threads += [threading.Thread(target=writer, args=(app, stop, counts, i * 1000))
+                for i in range(writers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return counts
+
+
+def main(seconds=5, readers=4, writers=2):
+    with tempfile.TemporaryDirectory() as tmp:
+        for label, sqlite_tuning in (('default', False), ('tuned', True)):
+            database_uri = 'sqlite:///' + os.path.join(tmp, label + '.db')
+            counts = run(build_app(database_uri, sqlite_tuning), seconds, readers, writers)
+            print('%-8s reads %7.1f/s  writes %7.1f/s  errors %d' % (
+                label, counts['reads'] / seconds, counts['writes'] / seconds,
+                counts['errors']))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:4]])
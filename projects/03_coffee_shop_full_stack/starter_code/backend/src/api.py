@@ -1,204 +1,319 @@
 import os
-from flask import Flask, request, jsonify, abort
+from flask import Flask, Response, request, jsonify, abort, stream_with_context
 from sqlalchemy import exc
 import json
+import click
 from flask_cors import CORS
 
-from .database.models import db_drop_and_create_all, setup_db, Drink
-from .auth.auth import AuthError, requires_auth
-
-app = Flask(__name__)
-setup_db(app)
-CORS(app)
-
-db_drop_and_create_all()
-
-## ROUTES
-'''
-Route handler for display existing drinks.
-'''
-@app.route('/drinks')
-def get_drinks():
-    drinks = Drink.query.all()
-
-    # 404 if not drinks found
-    if len(drinks) == 0:
-        abort(404)
-
-    # format using .short
-    drinks_short = [drink.short() for drink in drinks]
-
-    return jsonify({
-        "success": True,
-        "drinks": drinks_short
-    })
-
-
-'''
-Route handler for get drink-details.
-Requires 'get:drinks-details' permission.
-'''
-@app.route('/drinks-detail')
-@requires_auth('get:drinks-detail')
-def get_drink_details(jwt):
-    drinks = Drink.query.all()
-
-    if len(drinks) == 0:
-        abort(404)
-    drinks_long = [drink.long() for drink in drinks]
-
-    return jsonify({
-        "success": True,
-        "drinks": drinks_long
-    })
-
-
-'''
-Route handler for create a new drink.
-Requires 'post:drinks' permission.
-'''
-@app.route('/drinks', methods=['POST'])
-@requires_auth('post:drinks')
-def add_drink(jwt):
-    # get the drink info from request
-    body = request.get_json()
-    title = body['title']
-    recipe = body['recipe']
-
-    # create new drink
-    drink = Drink(title=title, recipe = json.dumps(recipe))
-
-    try:
-        # add drink to database
-        drink.insert()
-    except Exception as e:
-        print('ERROR', str(e))
-        abort(422)
-
-    return jsonify({
-        "success": True,
-        "drinks": drink.long()
-    })
-
-
-'''
-Route handler for editing existing drink.
-Requires 'patch:drinks' permission.
-'''
-@app.route('/drinks/<int:id>', methods=['PATCH'])
-@requires_auth('patch:drinks')
-def edit_drinks_by_id(*args, **kwargs):
-    #get ID from the kwargs
-    id = kwargs['id']
-
-    #get drink by id
-    drink = Drink.query.filter_by(id=id).one_or_none()
-
-    if drink is None:
-        abort(404)
-
-    # get request body
-    body = request.get_json()
-
-    #update title if present in body
-    if 'title' in body:
-        drink.title = body['title']
-
-    #Update recipe if present in body
-    if 'recipe' in body:
-        drink.recipe = json.dumps(body['recipe'])
-
-    try:
-        #update drink in database
-        drink.insert()
-
-    except Exception as e:
-        # catch exception
-        print('EXCEPTION: ', str(e))
-
-        # Bad request
-        abort(400)
-
-    # Array containing .long representation
-    drink = [drink.long()]
-
-    # return drink to view
-    return jsonify({
-        'success': True,
-        'drinks': drink
-    })
-
-'''
-Route handler for delete existing drink.
-Requires 'delete:drinks' permission.
-'''
-@app.route('/drinks/<int:id>', methods=['DELETE'])
-@requires_auth('delete:drinks')
-def delete_drinks(*args, **kwargs):
-    # get ID from kwargs
-    id = kwargs['id']
-
-    #get drink by id
-    drink = Drink.query.filter_by(id=id).one_or_none()
-
-    if drink is None:
-        abort(404)
-
-    try:
-        drink.delete()
-    except Exception as e:
-        print('EXCEPTION: ', str(e))
-
-        abort(500)
-
-    # return status and deleted drink id
-    return jsonify({
-        'success': True,
-        'delete': id
-    })
-
-## Error Handling
-'''
-Example error handling for unprocessable entity
-'''
-@app.errorhandler(422)
-def unprocessable(error):
-    return jsonify({
-                    "success": False, 
-                    "error": 422,
-                    "message": "unprocessable"
-                    }), 422
-
-
-'''
-Error handler for resource not found
-'''
-@app.errorhandler(404)
-def resouce_not_found(error):
-    return jsonify({
-        "success": False,
-        "error": 404,
-        "message": "resource not found"
-    }), 404
-
-
-'''
-Error handler for bad request
-'''
-@app.errorhandler(400)
-def bad_request(error):
-    return jsonify({
-        "success": False,
-        "error": 400,
-        "message": "resource not found"
-    }), 400
+from .database.models import db, db_drop_and_create_all, setup_db, database_path, Drink, menu_version
+from .auth.auth import AuthError, requires_auth, authenticator, jwks_cache
+from .database.bulk import BATCH_SIZE, import_drinks, export_drinks
+from .cache import ResponseCache
 
 
 '''
-Error handling for AuthError
+create_app(test_config=None, reset_db=False)
+    builds the coffee shop application, `test_config` overrides the
+    flask config (e.g. SQLALCHEMY_DATABASE_URI)
+    the schema is left alone unless `reset_db` is set, use
+    `flask create-db` / `flask reset-db` to manage it explicitly
 '''
-@app.errorhandler(AuthError)
-def handle_auth_error(ex):
-    response = jsonify(ex.error)
-    response.status_code = ex.status_code
-    return response
+def create_app(test_config=None, reset_db=False):
+    app = Flask(__name__)
+    config = test_config or {}
+    setup_db(app, config.get('SQLALCHEMY_DATABASE_URI', database_path))
+    app.config.from_mapping(config)
+    CORS(app)
+
+    # fetch the signing keys at boot rather than on the first authenticated request
+    if jwks_cache.background:
+        jwks_cache.start()
+
+    if reset_db:
+        with app.app_context():
+            db_drop_and_create_all()
+
+    ## Schema management
+    @app.cli.command('create-db')
+    def create_db_command():
+        """Creates the missing tables, existing data is kept."""
+        db.create_all()
+        print('Created the coffee shop tables.')
+
+    @app.cli.command('reset-db')
+    def reset_db_command():
+        """Drops every table and creates a fresh schema."""
+        db_drop_and_create_all()
+        print('Reset the coffee shop database.')
+
+    @app.cli.command('import-drinks')
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--batch-size', default=BATCH_SIZE, show_default=True,
+                  type=click.IntRange(min=1))
+    def import_drinks_command(path, batch_size):
+        """Imports drinks from a JSON lines file, one drink per line."""
+        with open(path) as drinks_file:
+            report = import_drinks(drinks_file, batch_size)
+        print(json.dumps(report.format(), indent=2))
+
+    @app.cli.command('export-drinks')
+    @click.argument('path', type=click.Path(dir_okay=False, writable=True))
+    def export_drinks_command(path):
+        """Exports every drink to a JSON lines file."""
+        with open(path, 'w') as drinks_file:
+            drinks_file.writelines(export_drinks())
+
+    # serialized drink menus, valid while the menu_version row is unchanged
+    drinks_cache = ResponseCache()
+
+    '''
+    drinks_response(view, cache_control)
+        renders the drinks menu in the 'short' or 'long' form from the
+        response cache, only reading the menu version from the database
+        unless a drink was written since the body was cached
+        a request whose If-None-Match matches the ETag gets a 304
+    '''
+    def drinks_response(view, cache_control):
+        version = menu_version()
+        entry = drinks_cache.get(view, version)
+        if entry is None:
+            drinks = Drink.query.all()
+
+            # 404 if not drinks found
+            if len(drinks) == 0:
+                abort(404)
+
+            formatted = [drink.short() if view == 'short' else drink.long()
+                         for drink in drinks]
+            entry = drinks_cache.put(view, version, json.dumps({
+                "success": True,
+                "drinks": formatted
+            }))
+
+        etag, body = entry
+        response = app.response_class(body, mimetype='application/json')
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = cache_control
+        return response.make_conditional(request)
+
+
+    ## ROUTES
+    '''
+    Route handler for display existing drinks.
+    '''
+    @app.route('/drinks')
+    def get_drinks():
+        # format using .short
+        return drinks_response('short', 'no-cache')
+
+
+    '''
+    Route handler for get drink-details.
+    Requires 'get:drinks-details' permission.
+    '''
+    @app.route('/drinks-detail')
+    @requires_auth('get:drinks-detail')
+    def get_drink_details(jwt):
+        # format using .long, only the client may keep a copy
+        return drinks_response('long', 'private, no-cache')
+
+
+    '''
+    Route handler for create a new drink.
+    Requires 'post:drinks' permission.
+    '''
+    @app.route('/drinks', methods=['POST'])
+    @requires_auth('post:drinks')
+    def add_drink(jwt):
+        # get the drink info from request
+        body = request.get_json()
+        title = body['title']
+        recipe = body['recipe']
+
+        # create new drink
+        drink = Drink(title=title, recipe = json.dumps(recipe))
+
+        try:
+            # add drink to database
+            drink.insert()
+        except Exception as e:
+            print('ERROR', str(e))
+            abort(422)
+
+        return jsonify({
+            "success": True,
+            "drinks": drink.long()
+        })
+
+
+    '''
+    Route handler for bulk import of drinks.
+    The body is a JSON lines stream, one {'title', 'recipe'} drink per line,
+    inserted `batch_size` drinks per transaction. Invalid lines are
+    reported back and skipped.
+    Requires 'post:drinks' permission.
+    '''
+    @app.route('/drinks/bulk', methods=['POST'])
+    @requires_auth('post:drinks')
+    def import_drinks_in_bulk(jwt):
+        batch_size = request.args.get('batch_size', BATCH_SIZE, type=int)
+        if batch_size < 1:
+            abort(400)
+
+        report = import_drinks(request.stream, batch_size)
+
+        return jsonify({
+            "success": True,
+            "import": report.format()
+        })
+
+
+    '''
+    Route handler for streaming every drink out as JSON lines.
+    Requires 'get:drinks-detail' permission.
+    '''
+    @app.route('/drinks/export')
+    @requires_auth('get:drinks-detail')
+    def export_drinks_stream(jwt):
+        return Response(stream_with_context(export_drinks()),
+                        mimetype='application/x-ndjson')
+
+
+    '''
+    Route handler for editing existing drink.
+    Requires 'patch:drinks' permission.
+    '''
+    @app.route('/drinks/<int:id>', methods=['PATCH'])
+    @requires_auth('patch:drinks')
+    def edit_drinks_by_id(*args, **kwargs):
+        #get ID from the kwargs
+        id = kwargs['id']
+
+        #get drink by id
+        drink = Drink.query.filter_by(id=id).one_or_none()
+
+        if drink is None:
+            abort(404)
+
+        # get request body
+        body = request.get_json()
+
+        #update title if present in body
+        if 'title' in body:
+            drink.title = body['title']
+
+        #Update recipe if present in body
+        if 'recipe' in body:
+            drink.recipe = json.dumps(body['recipe'])
+
+        try:
+            #update drink in database
+            drink.insert()
+
+        except Exception as e:
+            # catch exception
+            print('EXCEPTION: ', str(e))
+
+            # Bad request
+            abort(400)
+
+        # Array containing .long representation
+        drink = [drink.long()]
+
+        # return drink to view
+        return jsonify({
+            'success': True,
+            'drinks': drink
+        })
+
+    '''
+    Route handler for delete existing drink.
+    Requires 'delete:drinks' permission.
+    '''
+    @app.route('/drinks/<int:id>', methods=['DELETE'])
+    @requires_auth('delete:drinks')
+    def delete_drinks(*args, **kwargs):
+        # get ID from kwargs
+        id = kwargs['id']
+
+        #get drink by id
+        drink = Drink.query.filter_by(id=id).one_or_none()
+
+        if drink is None:
+            abort(404)
+
+        try:
+            drink.delete()
+        except Exception as e:
+            print('EXCEPTION: ', str(e))
+
+            abort(500)
+
+        # return status and deleted drink id
+        return jsonify({
+            'success': True,
+            'delete': id
+        })
+
+    '''
+    Route handler for the auth health check.
+    Reports the age of the signing keys, the result of the last JWKS fetch
+    and the verified token cache counters.
+    '''
+    @app.route('/health/auth')
+    def auth_health():
+        health = authenticator.health()
+        status_code = 200 if health['keys']['healthy'] else 503
+
+        return jsonify({
+            "success": status_code == 200,
+            "auth": health
+        }), status_code
+
+    ## Error Handling
+    '''
+    Example error handling for unprocessable entity
+    '''
+    @app.errorhandler(422)
+    def unprocessable(error):
+        return jsonify({
+                        "success": False, 
+                        "error": 422,
+                        "message": "unprocessable"
+                        }), 422
+
+
+    '''
+    Error handler for resource not found
+    '''
+    @app.errorhandler(404)
+    def resouce_not_found(error):
+        return jsonify({
+            "success": False,
+            "error": 404,
+            "message": "resource not found"
+        }), 404
+
+
+    '''
+    Error handler for bad request
+    '''
+    @app.errorhandler(400)
+    def bad_request(error):
+        return jsonify({
+            "success": False,
+            "error": 400,
+            "message": "resource not found"
+        }), 400
+
+
+    '''
+    Error handling for AuthError
+    '''
+    @app.errorhandler(AuthError)
+    def handle_auth_error(ex):
+        response = jsonify(ex.error)
+        response.status_code = ex.status_code
+        return response
+
+    return app
@@ -1,125 +1,41 @@
-import json
-from flask import request, _request_ctx_stack, abort
-from functools import wraps
-from jose import jwt
-from urllib.request import urlopen
+import os
 
+from fsnd_auth import (Auth, AuthError, AllOf, AnyOf, JWKSCache, TokenCache,
+                       get_token_auth_header, url_fetcher)
 
-AUTH0_DOMAIN = 'ravi-fsnd.auth0.com'
+
+AUTH0_DOMAIN = os.environ.get('AUTH0_DOMAIN', 'ravi-fsnd.auth0.com')
 ALGORITHMS = ['RS256']
-API_AUDIENCE = 'Coffee shop'
+API_AUDIENCE = os.environ.get('API_AUDIENCE', 'Coffee shop')
+
+JWKS_URL = f'https://{AUTH0_DOMAIN}/.well-known/jwks.json'
+# seconds a fetched key set is considered fresh
+JWKS_CACHE_TTL = int(os.environ.get('JWKS_CACHE_TTL', 600))
+# minimum seconds between two fetches, bounds refreshes forced by unknown kids
+JWKS_MIN_REFRESH_INTERVAL = int(os.environ.get('JWKS_MIN_REFRESH_INTERVAL', 30))
+# keep the keys warm from a background thread instead of the request path
+JWKS_BACKGROUND_REFRESH = os.environ.get('JWKS_BACKGROUND_REFRESH', 'true') == 'true'
+# number of verified tokens kept in memory
+TOKEN_CACHE_SIZE = int(os.environ.get('TOKEN_CACHE_SIZE', 1024))
 
-## AuthError Exception
 '''
-AuthError Exception
-A standardized way to communicate auth failure modes
+authenticator
+    the Auth0 verifier shared by every route of the coffee shop,
+    see the fsnd_auth package for the key and token caches behind it
 '''
-class AuthError(Exception):
-    def __init__(self, error, status_code):
-        self.error = error
-        self.status_code = status_code
-
-
-## Auth Header
-def get_token_auth_header():
-    auth = request.headers.get('Authorization', None)
-    if not auth:
-        raise AuthError({
-            'code': 'authorization_header_missing',
-            'description': 'Authorization header is expected'
-        }, 401)
-    parts = auth.split()
-    if parts[0].lower() != 'bearer':
-        raise AuthError({
-            'code': 'invalid_header',
-            'description': 'Authorization header must start with "Bearer".'
-        }, 401)
-    elif len(parts) == 1:
-        raise AuthError({
-            'code': 'invalid_header',
-            'description': 'token not found.'
-        }, 401)
-    elif len(parts) > 2:
-        raise AuthError({
-            'code': 'invalid_header',
-            'description': 'authorization must be bearer token.'
-        }, 401)
-    token = parts[1]
-    return token
-
-
-def check_permissions(permission, payload):
-    if 'permissions' not in payload:
-        abort(400)
-
-    if permission not in payload['permissions']:
-        abort(403)
-
-    return True
-
-
-def verify_decode_jwt(token):
-    jsonurl = urlopen(f'https://{AUTH0_DOMAIN}/.well-known/jwks.json')
-    jwks = json.loads(jsonurl.read())
-    unverified_header = jwt.get_unverified_header(token)
-    rsa_key = {}
-    if 'kid' not in unverified_header:
-        raise AuthError({
-            'code': 'invalid header',
-            'description': 'Authorization malformed.'
-        }, 401)
-
-    for key in jwks['keys']:
-        if key['kid'] == unverified_header['kid']:
-            rsa_key = {
-                'kty': key['kty'],
-                'kid': key['kid'],
-                'use': key['use'],
-                'n': key['n'],
-                'e': key['e']
-
-            }
-
-    if rsa_key:
-        try:
-            payload = jwt.decode(
-                token,
-                rsa_key,
-                algorithms=ALGORITHMS,
-                audience=API_AUDIENCE,
-                issuer='https://' + AUTH0_DOMAIN + '/'
-            )
-            return payload
-        except jwt.ExpiredSignatureError:
-            raise AuthError({
-                'code': 'token_expired',
-                'description': 'Token expired.'
-            }, 401)
-        except jwt.JWTClaimsError:
-            raise AuthError({
-                'code': 'invalid_claims',
-                'description': 'Incorrect claims. Please check the audience and issuer.'
-            }, 401)
-        except Exception:
-            raise AuthError({
-                'code': 'invalid_header',
-                'description': 'Unable to parse authentication token'
-            }, 400)
-
-    raise AuthError({
-        'code': 'invalid_header',
-        'description': 'unable to find appropriate key'
-    }, 400)
-
-
-def requires_auth(permission=''):
-    def requires_auth_decorator(f):
-        @wraps(f)
-        def wrapper(*args, **kwargs):
-            token = get_token_auth_header()
-            payload = verify_decode_jwt(token)
-            check_permissions(permission, payload)
-            return f(payload, *args, **kwargs)
-
-        return wrapper
-    return requires_auth_decorator
\ No newline at end of file
+authenticator = Auth(
+    AUTH0_DOMAIN,
+    API_AUDIENCE,
+    algorithms=ALGORITHMS,
+    key_source=JWKSCache(url_fetcher(JWKS_URL), ttl=JWKS_CACHE_TTL,
+                         min_refresh_interval=JWKS_MIN_REFRESH_INTERVAL,
+                         background=JWKS_BACKGROUND_REFRESH),
+    token_cache=TokenCache(maxsize=TOKEN_CACHE_SIZE)
+)
+
+jwks_cache = authenticator.key_source
+token_cache = authenticator.token_cache
+
+verify_decode_jwt = authenticator.verify_decode_jwt
+check_permissions = authenticator.check_permissions
+requires_auth = authenticator.requires_auth
@@ -0,0 +1,44 @@
+import hashlib
+import threading
+
+
+'''
+ResponseCache
+    pre-serialized response bodies for read-mostly views, stored per view
+    name together with a strong ETag (a digest of the body)
+    - every entry is stored with the `version` of the data it was rendered
+      from, and only served while the caller asks for that same version
+    - the version lives in the database (menu_version()), so writes made by
+      other worker processes or the flask CLI are seen on the next request
+    EXAMPLE
+        version = menu_version()
+        entry = drinks_cache.get('short', version)
+        if entry is None:
+            entry = drinks_cache.put('short', version, render())
+        etag, body = entry
+'''
+class ResponseCache:
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, view, version):
+        entry = self._entries.get(view)
+        if entry is None or entry[0] != version:
+            return None
+        return entry[1:]
+
+    def put(self, view, version, body):
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        entry = (version, hashlib.sha1(body).hexdigest(), body)
+        with self._lock:
+            # a slower request may finish rendering an older version last
+            current = self._entries.get(view)
+            if current is None or current[0] <= version:
+                self._entries[view] = entry
+        return entry[1:]
+
+    def clear(self):
+        with self._lock:
+            self._entries = {}
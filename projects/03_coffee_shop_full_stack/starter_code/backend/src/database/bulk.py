@@ -0,0 +1,162 @@
+import json
+from numbers import Number
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from .models import db, Drink, bump_menu_version
+
+BATCH_SIZE = 500
+# only the first errors are reported back, the count covers all of them
+MAX_REPORTED_ERRORS = 100
+
+
+'''
+validate_drink(data)
+    checks one decoded drink against the documented shape
+        {'title': string, 'recipe': [{'color': string, 'name': string, 'parts': number}]}
+    returns an error message, or None when the drink is valid
+'''
+def validate_drink(data):
+    if not isinstance(data, dict):
+        return 'drink must be an object'
+    title = data.get('title')
+    if not isinstance(title, str) or not title.strip():
+        return 'title must be a non empty string'
+    if len(title) > 80:
+        return 'title must be at most 80 characters'
+
+    recipe = data.get('recipe')
+    if not isinstance(recipe, list) or not recipe:
+        return 'recipe must be a non empty list'
+    if len(json.dumps(recipe)) > 180:
+        return 'recipe must be at most 180 characters as json'
+    for part in recipe:
+        if not isinstance(part, dict):
+            return 'recipe items must be objects'
+        if not isinstance(part.get('color'), str) or not isinstance(part.get('name'), str):
+            return 'recipe items need a string color and name'
+        parts = part.get('parts')
+        if not isinstance(parts, Number) or isinstance(parts, bool) or parts <= 0:
+            return 'recipe items need a positive number of parts'
+    return None
+
+
+'''
+ImportReport
+    outcome of a bulk import, errors are reported per line
+'''
+class ImportReport:
+    def __init__(self):
+        self.inserted = 0
+        self.batches = 0
+        self.error_count = 0
+        self.errors = []
+
+    def error(self, line, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line, 'error': message})
+
+    def format(self):
+        return {
+            'inserted': self.inserted,
+            'batches': self.batches,
+            'error_count': self.error_count,
+            'errors': self.errors
+        }
+
+
+def _insert_batch(batch, report):
+    # titles are unique, skip the ones already taken instead of failing the batch
+    titles = [row['title'] for _, row in batch]
+    taken = {title for (title,) in
+             db.session.query(Drink.title).filter(Drink.title.in_(titles))}
+
+    pending = []
+    for line, row in batch:
+        if row['title'] in taken:
+            report.error(line, 'a drink titled "{}" already exists'.format(row['title']))
+            continue
+        taken.add(row['title'])
+        pending.append((line, row))
+
+    try:
+        _insert_rows(pending)
+        report.inserted += len(pending)
+    except SQLAlchemyError:
+        db.session.rollback()
+        # e.g. a title taken by another writer meanwhile, retry the rows one
+        # by one so that only the failing ones are reported
+        for line, row in pending:
+            try:
+                _insert_rows([(line, row)])
+                report.inserted += 1
+            except SQLAlchemyError as e:
+                db.session.rollback()
+                report.error(line, 'insert failed: {}'.format(e.__class__.__name__))
+    report.batches += 1
+
+
+def _insert_rows(rows):
+    db.session.bulk_insert_mappings(Drink, [row for _, row in rows])
+    if rows:
+        bump_menu_version()
+    db.session.commit()
+
+
+'''
+import_drinks(lines, batch_size)
+    loads drinks from an iterable of JSON lines (str or bytes), one drink
+    per line, inserting the valid ones with one transaction per batch
+    invalid lines are reported and skipped, they never abort the load
+    EXAMPLE
+        with open('menu.jsonl') as menu:
+            report = import_drinks(menu)
+'''
+def import_drinks(lines, batch_size=BATCH_SIZE):
+    report = ImportReport()
+    batch = []
+    for number, line in enumerate(lines, start=1):
+        if isinstance(line, bytes):
+            line = line.decode('utf-8', errors='replace')
+        if not line.strip():
+            continue
+
+        try:
+            data = json.loads(line)
+        except ValueError:
+            report.error(number, 'invalid json')
+            continue
+        message = validate_drink(data)
+        if message:
+            report.error(number, message)
+            continue
+
+        batch.append((number, {'title': data['title'], 'recipe': json.dumps(data['recipe'])}))
+        if len(batch) >= batch_size:
+            _insert_batch(batch, report)
+            batch = []
+
+    if batch:
+        _insert_batch(batch, report)
+    return report
+
+
+'''
+export_drinks(batch_size)
+    yields every drink as a JSON line in the import format, reading the
+    table in id order one batch at a time
+'''
+def export_drinks(batch_size=BATCH_SIZE):
+    last_id = 0
+    while True:
+        rows = db.session.query(Drink.id, Drink.title, Drink.recipe).\
+            filter(Drink.id > last_id).\
+            order_by(Drink.id).\
+            limit(batch_size).\
+            all()
+        if not rows:
+            return
+        for row in rows:
+            yield json.dumps({'title': row.title, 'recipe': json.loads(row.recipe)}) + '\n'
+        last_id = rows[-1].id
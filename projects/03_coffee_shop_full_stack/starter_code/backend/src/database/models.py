@@ -1,23 +1,83 @@
 import os
-from sqlalchemy import Column, String, Integer
+import sqlite3
+import time
+from sqlalchemy import Column, String, Integer, BigInteger, event
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.pool import QueuePool
 from flask_sqlalchemy import SQLAlchemy
 import json
 
 database_filename = "database.db"
 project_dir = os.path.dirname(os.path.abspath(__file__))
-database_path = "sqlite:///{}".format(os.path.join(project_dir, database_filename))
+database_path = os.environ.get(
+    'DATABASE_URL', "sqlite:///{}".format(os.path.join(project_dir, database_filename)))
 
 db = SQLAlchemy()
 
+'''
+SQLite production profile
+    applied to file databases unless SQLITE_TUNING=false
+    - WAL lets readers proceed while a writer commits
+    - synchronous=NORMAL only fsyncs at checkpoints, which is safe with WAL
+    - writers wait up to SQLITE_BUSY_TIMEOUT seconds instead of failing
+      with "database is locked"
+    - connections are kept in a pool instead of reopened per checkout,
+      so the pragmas run once per connection
+'''
+SQLITE_TUNING = os.environ.get('SQLITE_TUNING', 'true') == 'true'
+SQLITE_BUSY_TIMEOUT = 5
+SQLITE_PRAGMAS = [
+    ('journal_mode', 'WAL'),
+    ('synchronous', 'NORMAL'),
+    ('busy_timeout', SQLITE_BUSY_TIMEOUT * 1000),
+    # 256 MiB of the file memory-mapped
+    ('mmap_size', 256 * 1024 * 1024),
+    # negative values are KiB, i.e. a 64 MiB page cache per connection
+    ('cache_size', -64 * 1024),
+    ('temp_store', 'MEMORY')
+]
+SQLITE_ENGINE_OPTIONS = {
+    # SQLAlchemy would otherwise open a new file connection per checkout
+    'poolclass': QueuePool,
+    'pool_size': 5,
+    'max_overflow': 10,
+    'pool_timeout': 30,
+    'connect_args': {
+        'timeout': SQLITE_BUSY_TIMEOUT,
+        # pooled connections are handed to whichever thread checks them out
+        'check_same_thread': False
+    }
+}
+
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS:
+        cursor.execute('PRAGMA {}={}'.format(name, value))
+    cursor.close()
+
+
+def is_sqlite_file(database_path):
+    url = make_url(database_path)
+    return url.drivername.startswith('sqlite') and url.database not in (None, '', ':memory:')
+
 '''
 setup_db(app)
     binds a flask application and a SQLAlchemy service
+    file based SQLite databases get the production profile above
 '''
-def setup_db(app):
+def setup_db(app, database_path=database_path, sqlite_tuning=SQLITE_TUNING):
     app.config["SQLALCHEMY_DATABASE_URI"] = database_path
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    tuned = sqlite_tuning and is_sqlite_file(database_path)
+    if tuned:
+        app.config.setdefault("SQLALCHEMY_ENGINE_OPTIONS", SQLITE_ENGINE_OPTIONS)
     db.app = app
     db.init_app(app)
+    if tuned:
+        event.listen(db.get_engine(app), 'connect', set_sqlite_pragmas)
 
 '''
 db_drop_and_create_all()
@@ -29,6 +89,47 @@ def db_drop_and_create_all():
     db.drop_all()
     db.create_all()
 
+'''
+MenuVersion
+a single row counting the writes to the drinks table, shared by every
+worker process (and the flask CLI) through the database
+the response caches compare it with the version their bodies were
+rendered at, see menu_version() / bump_menu_version()
+'''
+class MenuVersion(db.Model):
+    __tablename__ = 'menu_version'
+
+    id = Column(Integer, primary_key=True)
+    version = Column(BigInteger, nullable=False)
+
+
+@event.listens_for(MenuVersion.__table__, 'after_create')
+def insert_menu_version(target, connection, **kw):
+    # start from the clock, so a recreated table never reuses a version
+    # a worker still has cached bodies for
+    connection.execute(target.insert(), {'id': 1, 'version': int(time.time() * 1000)})
+
+
+'''
+menu_version()
+    the current version of the drinks menu, a primary key lookup
+'''
+def menu_version():
+    return db.session.query(MenuVersion.version).filter(MenuVersion.id == 1).scalar() or 0
+
+
+'''
+bump_menu_version()
+    moves the menu to a new version in the current transaction, call it
+    before committing any write to the drinks table
+'''
+def bump_menu_version():
+    updated = MenuVersion.query.filter(MenuVersion.id == 1).\
+        update({MenuVersion.version: MenuVersion.version + 1}, synchronize_session=False)
+    if not updated:
+        db.session.add(MenuVersion(id=1, version=int(time.time() * 1000)))
+
+
 '''
 Drink
 a persistent drink entity, extends the base SQLAlchemy Model
@@ -42,14 +143,27 @@ class Drink(db.Model):
     # the required datatype is [{'color': string, 'name':string, 'parts':number}]
     recipe =  Column(String(180), nullable=False)
 
+    '''
+    parsed_recipe()
+        the recipe blob parsed from json, memoized on the instance
+        the memo is keyed on the raw string so assigning `recipe`
+        (or reloading the row) invalidates it
+    '''
+    def parsed_recipe(self):
+        memo = self.__dict__.get('_recipe_memo')
+        if memo is None or memo[0] is not self.recipe:
+            recipe = json.loads(self.recipe)
+            short_recipe = [{'color': r['color'], 'parts': r['parts']} for r in recipe]
+            memo = (self.recipe, recipe, short_recipe)
+            self._recipe_memo = memo
+        return memo
+
     '''
     short()
         short form representation of the Drink model
     '''
     def short(self):
-        print(json.loads(self.recipe))
-        short_recipe = json.loads(self.recipe)
-        # short_recipe = [{'color': r['color'], 'parts': r['parts']} for r in json.loads(self.recipe)]
+        _, _, short_recipe = self.parsed_recipe()
         return {
             'id': self.id,
             'title': self.title,
@@ -61,10 +175,11 @@ class Drink(db.Model):
         long form representation of the Drink model
     '''
     def long(self):
+        _, recipe, _ = self.parsed_recipe()
         return {
             'id': self.id,
             'title': self.title,
-            'recipe': json.loads(self.recipe)
+            'recipe': recipe
         }
 
     '''
@@ -78,6 +193,7 @@ class Drink(db.Model):
     '''
     def insert(self):
         db.session.add(self)
+        bump_menu_version()
         db.session.commit()
 
     '''
@@ -90,6 +206,7 @@ class Drink(db.Model):
     '''
     def delete(self):
         db.session.delete(self)
+        bump_menu_version()
         db.session.commit()
 
     '''
@@ -102,6 +219,7 @@ class Drink(db.Model):
             drink.update()
     '''
     def update(self):
+        bump_menu_version()
         db.session.commit()
 
     def __repr__(self):
@@ -0,0 +1,14 @@
+import os
+
+from fsnd_auth import Auth, AuthError, AllOf, AnyOf
+
+
+AUTH0_DOMAIN = os.environ.get('AUTH0_DOMAIN', 'ravi-fsnd.auth0.com')
+ALGORITHMS = ['RS256']
+API_AUDIENCE = os.environ.get('API_AUDIENCE', 'capstone')
+
+authenticator = Auth(AUTH0_DOMAIN, API_AUDIENCE, algorithms=ALGORITHMS)
+
+verify_decode_jwt = authenticator.verify_decode_jwt
+check_permissions = authenticator.check_permissions
+requires_auth = authenticator.requires_auth